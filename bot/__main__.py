@@ -15,6 +15,7 @@ async def on_startup():
 @dispatcher.shutdown()
 async def on_shutdown():
     await services.dispose(dispatcher)
+    await dispatcher.fsm.storage.close()
 
 
 def import_routers():
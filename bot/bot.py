@@ -1,9 +1,11 @@
-from aiogram.fsm.storage.memory import MemoryStorage
-
 from .models.config.bot_config import BotConfig
 from .models.phrases.bot_phrases import BotPhrases
 from .utils.bot import Bot
 from .utils.dispatcher import Dispatcher
+from .utils.paths import root_path
+from .utils.storage import SQLiteStorage
 
 bot = Bot(BotConfig.load_first(), BotPhrases.load_first(), parse_mode="HTML")
-dispatcher = Dispatcher(storage=MemoryStorage())
+dispatcher = Dispatcher(
+    storage=SQLiteStorage(root_path / bot.config.fsm_storage_path)
+)
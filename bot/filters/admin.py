@@ -9,4 +9,4 @@ class AdminFilter(Filter):
         if telegram_object.from_user is None:
             return False
 
-        return telegram_object.from_user.id in bot.config.admin_user_ids
+        return telegram_object.from_user.id in bot.admin_user_ids
@@ -0,0 +1,15 @@
+from aiogram import types
+from aiogram.filters.base import Filter
+
+from ..bot import bot
+
+
+class PhraseFilter(Filter):
+    def __init__(self, name: str):
+        self.name = name
+
+    async def __call__(self, message: types.Message):
+        if message.text is None:
+            return False
+
+        return self.name in bot.phrase_index.get(message.text, ())
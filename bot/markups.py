@@ -1,4 +1,5 @@
 from enum import IntEnum
+from typing import Tuple, Union
 
 from aiogram import types
 from aiogram.filters.callback_data import CallbackData
@@ -6,8 +7,10 @@ from aiogram.types import InlineKeyboardButton, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
 from .bot import bot
-from .services.database.models import InlineMenu, ReplyMenu
-from .utils.enums import Alignment
+from .services.database.models import InlineMenu, MessageFile, ReplyMenu
+from .services.menu_tree.nodes import InlineMenuNode, ReplyMenuNode
+from .utils.enums import Alignment, MailingStatus
+from .utils.lru_cache import LRUCache
 
 
 class AdminInlineMenuCallbackData(CallbackData, prefix="admin-inline"):
@@ -37,6 +40,23 @@ class UserInlineMenuCallbackData(CallbackData, prefix="user-inline"):
     menu_id: int
 
 
+class MailingCallbackData(CallbackData, prefix="mailing"):
+    class Action(IntEnum):
+        pause = 0
+        resume = 1
+        cancel = 2
+
+    action: Action
+    mailing_id: int
+
+
+# (kind, node id, alignment, tree version) -> finished markup
+user_markups_cache: LRUCache[
+    Tuple[str, int, Alignment, int],
+    Union[types.ReplyKeyboardMarkup, types.InlineKeyboardMarkup],
+] = LRUCache(maxsize=1024)
+
+
 async def create_admin_reply_menu_markup(reply_menu: ReplyMenu):
     await reply_menu.fetch_related("parent", "children", "inline_menu")
 
@@ -77,7 +97,8 @@ async def create_admin_reply_menu_markup(reply_menu: ReplyMenu):
 
 
 async def create_admin_inline_menu_markup(inline_menu: InlineMenu):
-    await inline_menu.fetch_related("parent", "children", "file")
+    await inline_menu.fetch_related("parent", "children")
+    has_file = await MessageFile.filter(inline_menu_id=inline_menu.id).exists()
 
     builder = InlineKeyboardBuilder()
 
@@ -185,7 +206,7 @@ async def create_admin_inline_menu_markup(inline_menu: InlineMenu):
         )
     )
 
-    if inline_menu.file:
+    if has_file:
         builder.add(
             types.InlineKeyboardButton(
                 text=bot.phrases.admin.remove_file,
@@ -220,8 +241,11 @@ async def create_admin_inline_menu_markup(inline_menu: InlineMenu):
     return builder.as_markup()
 
 
-async def create_user_reply_menu_markup(reply_menu: ReplyMenu):
-    await reply_menu.fetch_related("parent", "children", "inline_menu")
+def create_user_reply_menu_markup(reply_menu: ReplyMenuNode):
+    cache_key = ("reply", reply_menu.id, reply_menu.alignment, reply_menu.version)
+
+    if (markup := user_markups_cache.get(cache_key)) is not None:
+        return markup
 
     builder = ReplyKeyboardBuilder()
 
@@ -238,11 +262,16 @@ async def create_user_reply_menu_markup(reply_menu: ReplyMenu):
             KeyboardButton(text=reply_menu.back_button_text or bot.phrases.back),
         )
 
-    return builder.as_markup(resize_keyboard=True)
+    markup = builder.as_markup(resize_keyboard=True)
+    user_markups_cache.set(cache_key, markup)
+    return markup
+
 
+def create_user_inline_menu_markup(inline_menu: InlineMenuNode):
+    cache_key = ("inline", inline_menu.id, inline_menu.alignment, inline_menu.version)
 
-async def create_user_inline_menu_markup(inline_menu: InlineMenu):
-    await inline_menu.fetch_related("parent", "children", "file")
+    if (markup := user_markups_cache.get(cache_key)) is not None:
+        return markup
 
     builder = InlineKeyboardBuilder()
 
@@ -275,4 +304,34 @@ async def create_user_inline_menu_markup(inline_menu: InlineMenu):
             )
         )
 
+    markup = builder.as_markup()
+    user_markups_cache.set(cache_key, markup)
+    return markup
+
+
+def create_mailing_markup(mailing_id: int, status: MailingStatus):
+    if status == MailingStatus.running:
+        action = MailingCallbackData.Action.pause
+        text = bot.phrases.admin.pause_mailing
+    elif status == MailingStatus.paused:
+        action = MailingCallbackData.Action.resume
+        text = bot.phrases.admin.resume_mailing
+    else:
+        return None
+
+    builder = InlineKeyboardBuilder()
+    builder.add(
+        InlineKeyboardButton(
+            text=text,
+            callback_data=MailingCallbackData(
+                action=action, mailing_id=mailing_id
+            ).pack(),
+        ),
+        InlineKeyboardButton(
+            text=bot.phrases.admin.cancel_mailing,
+            callback_data=MailingCallbackData(
+                action=MailingCallbackData.Action.cancel, mailing_id=mailing_id
+            ).pack(),
+        ),
+    )
     return builder.as_markup()
@@ -1,13 +1,45 @@
+from ..bot import bot
 from ..utils.dispatcher import Dispatcher
+from ..utils.paths import root_path
 from .bot_user import BotUserMiddleware
+from .journal import (
+    HandlerJournalMiddleware,
+    RequestJournalMiddleware,
+    UpdateJournalMiddleware,
+)
 from .services_di import ServicesDIMiddleware
 
 
+def setup_journal(dispatcher: Dispatcher):
+    journal = dispatcher.journal
+
+    async def on_startup():
+        journal.start(root_path / bot.config.journal_path)
+
+    async def on_shutdown():
+        await journal.close()
+
+    dispatcher.startup.register(on_startup)
+    dispatcher.shutdown.register(on_shutdown)
+
+    dispatcher.update.outer_middleware.register(UpdateJournalMiddleware(journal))
+    handler_journal_middleware = HandlerJournalMiddleware(journal)
+    dispatcher.message.middleware.register(handler_journal_middleware)
+    dispatcher.callback_query.middleware.register(handler_journal_middleware)
+    bot.session.middleware(RequestJournalMiddleware(journal))
+
+
 def setup(dispatcher: Dispatcher):
-    bot_user_middleware = BotUserMiddleware()
+    bot_user_middleware = BotUserMiddleware(dispatcher)
     dispatcher.message.middleware.register(bot_user_middleware)
     dispatcher.callback_query.middleware.register(bot_user_middleware)
 
     services_di_middleware = ServicesDIMiddleware(dispatcher)
+    # outer, so that filters can depend on services too
+    dispatcher.message.outer_middleware.register(services_di_middleware)
+    dispatcher.callback_query.outer_middleware.register(services_di_middleware)
     dispatcher.message.middleware.register(services_di_middleware)
     dispatcher.callback_query.middleware.register(services_di_middleware)
+
+    if bot.config.journal_enabled:
+        setup_journal(dispatcher)
@@ -4,10 +4,14 @@ from aiogram import types
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
 
 from ..protocols.telegram_user_event import TelegramUserEvent
-from ..services.database.models import BotUser
+from ..services.bot_user import BotUserService
+from ..utils.dispatcher import Dispatcher
 
 
 class BotUserMiddleware(BaseMiddleware):
+    def __init__(self, dispatcher: Dispatcher):
+        self.dispatcher = dispatcher
+
     async def __call__(
         self,
         handler: Callable[[TelegramUserEvent, Dict[str, Any]], Awaitable[Any]],
@@ -16,10 +20,7 @@ class BotUserMiddleware(BaseMiddleware):
     ) -> Any:
         from_user: types.User = event.from_user  # type: ignore
 
-        bot_user, _ = await BotUser.get_or_create(
-            dict(username=from_user.username, full_name=from_user.full_name),
-            id=from_user.id,
-        )
-
-        data["bot_user"] = bot_user
+        bot_user_service = self.dispatcher.services.get(BotUserService)
+        data["bot_user"] = bot_user_service.get(from_user)
+        bot_user_service.track(event, from_user.id)
         return await handler(event, data)
@@ -0,0 +1,85 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import Bot, types
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from ..protocols.telegram_user_event import TelegramUserEvent
+from ..utils.journal import EventJournal
+
+
+def get_handler_name(handler_object: HandlerObject):
+    callback = handler_object.callback
+    module = getattr(callback, "__module__", None)
+    name = getattr(callback, "__qualname__", None)
+    return f"{module}.{name}" if module and name else repr(callback)
+
+
+class UpdateJournalMiddleware(BaseMiddleware):
+    def __init__(self, journal: EventJournal):
+        self.journal = journal
+
+    async def __call__(
+        self,
+        handler: Callable[[types.TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: types.Update,  # type: ignore
+        data: Dict[str, Any],
+    ) -> Any:
+        event_user: Optional[types.User] = data.get("event_from_user")
+        self.journal.record(
+            "update",
+            update_id=event.update_id,
+            event_type=event.event_type,
+            user_id=event_user.id if event_user else None,
+        )
+        return await handler(event, data)
+
+
+class HandlerJournalMiddleware(BaseMiddleware):
+    def __init__(self, journal: EventJournal):
+        self.journal = journal
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramUserEvent, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramUserEvent,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_name = get_handler_name(data["handler"])
+        user_id = event.from_user.id if event.from_user else None
+        self.journal.record("handler", handler=handler_name, user_id=user_id)
+        return await handler(event, data)
+
+
+class RequestJournalMiddleware(BaseRequestMiddleware):
+    def __init__(self, journal: EventJournal):
+        self.journal = journal
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        started_at = time.perf_counter()
+        error = None
+
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.journal.record(
+                "api_call",
+                method=type(method).__name__,
+                duration_ms=round((time.perf_counter() - started_at) * 1000, 1),
+                error=error,
+            )
@@ -0,0 +1,21 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+
+from ..protocols.telegram_user_event import TelegramUserEvent
+from ..utils.enums import Lane
+from ..utils.lanes import use_lane
+
+
+class LaneMiddleware(BaseMiddleware):
+    def __init__(self, lane: Lane):
+        self.lane = lane
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramUserEvent, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramUserEvent,
+        data: Dict[str, Any],
+    ) -> Any:
+        with use_lane(self.lane):
+            return await handler(event, data)
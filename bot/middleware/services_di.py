@@ -1,33 +1,82 @@
-import re
-from typing import Any, Awaitable, Callable, Dict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
 
-from aiogram import types
+from aiogram.dispatcher.event.handler import CallableMixin, HandlerObject
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
 
 from ..protocols.telegram_user_event import TelegramUserEvent
 from ..utils.dispatcher import Dispatcher
 
 
-def snake_case(s: str):
-    return "_".join(
-        re.sub(
-            "([A-Z][a-z]+)", r" \1", re.sub("([A-Z]+)", r" \1", s.replace("-", " "))
-        ).split()
-    ).lower()
-
-
 class ServicesDIMiddleware(BaseMiddleware):
+    # registered as outer middleware it injects services that filters ask for,
+    # as inner one - services that the matched handler asks for
     def __init__(self, dispatcher: Dispatcher):
         self.dispatcher = dispatcher
 
+        self._revision = -1
+        self._filter_keys: Optional[Tuple[str, ...]] = None
+        self._handler_keys: Dict[Any, Tuple[str, ...]] = {}
+
+    def _get_wanted_keys(self, callable_objects: Iterable[CallableMixin]):
+        services = self.dispatcher.services
+        keys = set()
+
+        for callable_object in callable_objects:
+            spec = callable_object.spec
+
+            if spec.varkw:
+                keys.update(services.keys)
+                continue
+
+            keys.update(
+                arg for arg in (*spec.args, *spec.kwonlyargs) if services.has(arg)
+            )
+
+        return tuple(keys)
+
+    def _get_filter_keys(self):
+        if self._filter_keys is None:
+            filters = []
+
+            for router in self.dispatcher.chain_tail:
+                for observer in router.observers.values():
+                    for handler_object in (observer._handler, *observer.handlers):
+                        filters.extend(handler_object.filters or ())
+
+            self._filter_keys = self._get_wanted_keys(filters)
+
+        return self._filter_keys
+
+    def _get_handler_keys(self, handler_object: HandlerObject):
+        callback = handler_object.callback
+
+        if (keys := self._handler_keys.get(callback)) is None:
+            keys = self._handler_keys[callback] = self._get_wanted_keys(
+                (handler_object,)
+            )
+
+        return keys
+
     async def __call__(
         self,
         handler: Callable[[TelegramUserEvent, Dict[str, Any]], Awaitable[Any]],
         event: TelegramUserEvent,
         data: Dict[str, Any],
     ) -> Any:
-        for service in self.dispatcher.services._services:
-            service_key = snake_case(service.__class__.__name__)
-            data[service_key] = service
+        services = self.dispatcher.services
+
+        if self._revision != services.revision:
+            self._revision = services.revision
+            self._filter_keys = None
+            self._handler_keys.clear()
+
+        if (handler_object := data.get("handler")) is None:
+            keys = self._get_filter_keys()
+        else:
+            keys = self._get_handler_keys(handler_object)
+
+        for key in keys:
+            if key not in data:
+                data[key] = await services.resolve(key)
 
         return await handler(event, data)
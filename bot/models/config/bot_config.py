@@ -9,3 +9,13 @@ class BotConfig(ConfigModel):
     bot_token: str = Field("API токен из @BotFather")
     admin_user_ids: list[int] = Field([])
     database_uri: str = Field("sqlite://database.sqlite3")
+    blob_store_path: str = Field("blobs")
+    fsm_storage_path: str = Field("fsm.sqlite3")
+    fsm_idle_ttl: int = Field(3600)
+    mailing_workers_count: int = Field(8)
+    mailing_rate: float = Field(25)
+    journal_enabled: bool = Field(True)
+    journal_path: str = Field("journal")
+    api_rate: float = Field(30)
+    private_chat_rate: float = Field(1)
+    group_chat_rate_per_minute: float = Field(20)
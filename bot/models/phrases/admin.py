@@ -20,4 +20,62 @@ class AdminPhrases(BaseModel):
     edit_name: str = Field("Изм. название")
     enter_mailing_message_text: str = Field("Введите сообщение рассылки")
     mailing_started_message_text: str = Field("Рассылка началась")
-    sent_messages_message_text_fmt: str = Field("Отправлено {sent_messages_count} сообщений")
\ No newline at end of file
+    sent_messages_message_text_fmt: str = Field(
+        "Отправлено {sent_messages_count} сообщений\n"
+        "Заблокировали бота: {blocked_count}\n"
+        "Ошибок: {failed_count}\n"
+        "Время: {elapsed:.0f} с, {throughput:.1f} сообщений/с"
+    )
+    mailing_progress_message_text_fmt: str = Field(
+        "Рассылка #{id}: {status}\n"
+        "Отправлено: {sent_count} из {total_count}\n"
+        "Заблокировали бота: {blocked_count}\n"
+        "Ошибок: {failed_count}\n"
+        "Скорость: {throughput:.1f} сообщений/с\n"
+        "Осталось: {eta}"
+    )
+    mailing_list_item_fmt: str = Field(
+        "#{id} от {created_at:%d.%m.%Y %H:%M}: {status}, {processed_count} из "
+        "{total_count}"
+    )
+    no_mailings: str = Field("Рассылок ещё не было")
+    mailing_running: str = Field("идёт")
+    mailing_paused: str = Field("на паузе")
+    mailing_finished: str = Field("завершена")
+    mailing_cancelled: str = Field("отменена")
+    mailing_failed: str = Field("прервана из-за ошибки")
+    mailing_failed_message_text_fmt: str = Field(
+        "Рассылка #{id} прервана из-за ошибки, подробности в логах"
+    )
+    pause_mailing: str = Field("Пауза")
+    resume_mailing: str = Field("Продолжить")
+    cancel_mailing: str = Field("Отменить")
+    export_usage: str = Field(
+        "Использование: /export [xlsx|csv|csv.gz|jsonl|jsonl.gz] [new]\n"
+        "new — только пользователи, появившиеся или изменившиеся после прошлой "
+        "выгрузки"
+    )
+    stats_usage: str = Field("Использование: /stats [часы]")
+    stats_message_text_fmt: str = Field(
+        "Статистика за {hours} ч\n"
+        "Пользователей: {users_count}\n"
+        "Нажатий: {clicks_count}\n"
+        "/start: {start_count}\n\n"
+        "Популярные кнопки:\n"
+        "{top_nodes}"
+    )
+    stats_node_fmt: str = Field(
+        "{position}. {name} — {clicks_count} нажатий, {users_count} польз."
+    )
+    outbound_stats_message_text_fmt: str = Field(
+        "Запросов к API: {requests_count}\n"
+        "Задержано: {delayed_count}, ожидание {wait_time:.1f} с "
+        "(макс. {max_wait_time:.1f} с)\n"
+        "Flood-ошибок: {retry_after_count}, пауза {retry_after_time:.0f} с\n"
+        "Исчерпано повторов: {exhausted_count}\n\n"
+        "Очереди:\n"
+        "{lanes}"
+    )
+    outbound_lane_fmt: str = Field(
+        "{lane} — в очереди {depth}, отправлено {granted_count}"
+    )
\ No newline at end of file
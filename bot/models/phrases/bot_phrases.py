@@ -1,4 +1,7 @@
-from pydantic import Field
+from collections import defaultdict
+from typing import DefaultDict, Dict, FrozenSet, Set
+
+from pydantic import BaseModel, Field
 
 from ..config_model import ConfigModel
 from .admin import AdminPhrases
@@ -12,3 +15,17 @@ class BotPhrases(ConfigModel):
     bot_started: str = Field("Бот {me.username} успешно запущен")
     back: str = Field("Назад")
     loading_message: str = Field("...")
+
+    def index(self) -> Dict[str, FrozenSet[str]]:
+        # phrase text -> dotted names of phrases with that text, e.g. "admin.add_button"
+        index: DefaultDict[str, Set[str]] = defaultdict(set)
+
+        def walk(model: BaseModel, prefix: str):
+            for name, value in model:
+                if isinstance(value, BaseModel):
+                    walk(value, f"{prefix}{name}.")
+                elif isinstance(value, str):
+                    index[value].add(f"{prefix}{name}")
+
+        walk(self, "")
+        return {text: frozenset(names) for text, names in index.items()}
@@ -0,0 +1,17 @@
+from typing import AsyncIterable, Iterable, Protocol, Tuple
+
+from aiogram import types
+
+
+class BlobStore(Protocol):
+    async def put_stream(self, chunks: AsyncIterable[bytes]) -> Tuple[str, int]:
+        ...
+
+    async def delete(self, content_hash: str) -> None:
+        ...
+
+    def hashes(self) -> Iterable[str]:
+        ...
+
+    def input_file(self, content_hash: str, filename: str) -> types.InputFile:
+        ...
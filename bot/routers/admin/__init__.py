@@ -1,7 +1,12 @@
 from ...filters.admin import AdminFilter
+from ...middleware.lane import LaneMiddleware
+from ...utils.enums import Lane
 from ...utils.router import Router
 from .. import root_handlers_router
 
 router = Router()
 router.bind_filter(AdminFilter())
+# admin screens go after user replies, but ahead of mailings and cleanups
+router.message.middleware.register(LaneMiddleware(Lane.admin))
+router.callback_query.middleware.register(LaneMiddleware(Lane.admin))
 root_handlers_router.include_router(router)
@@ -12,6 +12,7 @@ async def admin_command_handler(
     message: types.Message, state: FSMContext, bot_user: BotUser
 ):
     root_menu = await ReplyMenu.get_root_menu()
+    reply_menu.forget_reply_markup(bot_user.id)
     dialog_messages = await reply_menu.send_admin_reply_menu(bot_user, root_menu)
     await state.set_state(AdminReplyMenuState.waiting_action)
-    await state.update_data(menu=root_menu, dialog_messages=dialog_messages)
+    await state.update_data(menu_id=root_menu.id, dialog_messages=dialog_messages)
@@ -1,40 +1,92 @@
-﻿from io import BytesIO
+﻿import asyncio
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
 
 from aiogram import types
-from aiogram.filters.command import Command
-from openpyxl import Workbook
+from aiogram.filters.command import Command, CommandObject
+from tortoise.expressions import Q
 
-from ...services.database.models import BotUser
+from ...bot import bot
+from ...services.database.models import BotUser, UserExport
+from ...services.database.pagination import iter_chunks
+from ...utils.exporters import EXPORT_FORMATS, create_exporter
 from . import router
 
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_COLUMNS = ("ID", "Full name", "Username", "Created at", "Updated at")
+
+
+def format_datetime(value: Optional[datetime]):
+    return value.isoformat(sep=" ", timespec="seconds") if value else ""
+
 
 @router.message(Command("export"))
-async def export_command_handler(message: types.Message):
-    bot_users = await BotUser.all()
+async def export_command_handler(message: types.Message, command: CommandObject):
+    export_format = "xlsx"
+    is_incremental = False
 
-    wb = Workbook()
-    ws = wb.active
+    for arg in (command.args or "").split():
+        if arg in EXPORT_FORMATS:
+            export_format = arg
+        elif arg == "new":
+            is_incremental = True
+        else:
+            return await message.answer(bot.phrases.admin.export_usage)
 
-    title_row = (
-        "ID",
-        "Full name",
-        "Username",
-    )
+    started_at = datetime.now(timezone.utc)
+    bot_users = BotUser.all()
 
-    ws.append(title_row)  # type: ignore
+    if is_incremental and (
+        last_export := await UserExport.all().order_by("-id").first()
+    ):
+        bot_users = bot_users.filter(
+            Q(created_at__gt=last_export.started_at)
+            | Q(updated_at__gt=last_export.started_at)
+        )
+
+    rows_count = 0
 
-    for bot_user in bot_users:
-        ws.append(  # type: ignore
-            (
-                str(bot_user.id),
-                bot_user.full_name,
-                f"@{bot_user.username}" if bot_user.username else "",
-            )
+    with tempfile.TemporaryDirectory() as temp_dir_path:
+        export_path = Path(temp_dir_path) / f"users.{export_format}"
+        exporter = await asyncio.to_thread(
+            create_exporter, export_format, export_path, EXPORT_COLUMNS
         )
 
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    input_file = types.BufferedInputFile(buffer.read(), "users.xlsx")
+        # rows are written in a worker thread, so updates keep being handled
+        try:
+            async for rows in iter_chunks(
+                bot_users,
+                "id",
+                "full_name",
+                "username",
+                "created_at",
+                "updated_at",
+                chunk_size=EXPORT_CHUNK_SIZE,
+            ):
+                await asyncio.to_thread(
+                    exporter.write_rows,
+                    [
+                        (
+                            user_id,
+                            full_name,
+                            f"@{username}" if username else "",
+                            format_datetime(created_at),
+                            format_datetime(updated_at),
+                        )
+                        for user_id, full_name, username, created_at, updated_at in rows
+                    ],
+                )
+                rows_count += len(rows)
+        finally:
+            await asyncio.to_thread(exporter.close)
 
-    await message.answer_document(input_file)
+        await message.answer_document(types.FSInputFile(export_path))
+
+    await UserExport.create(
+        export_format=export_format,
+        is_incremental=is_incremental,
+        rows_count=rows_count,
+        started_at=started_at,
+    )
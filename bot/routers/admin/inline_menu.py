@@ -1,13 +1,14 @@
 ﻿from io import BytesIO
 from pathlib import Path
-from typing import BinaryIO
 
 from aiogram import F, types
 from aiogram.fsm.context import FSMContext
 
 from ... import markups
 from ...bot import bot
+from ...services.blob_store import BlobStoreService
 from ...services.database.models import BotUser, InlineMenu, MessageFile, ReplyMenu
+from ...services.menu_tree import MenuTreeService
 from ...state import (
     AddInlineMenuButtonState,
     AddUrlButtonState,
@@ -33,12 +34,13 @@ async def add_button_handler(
     query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
 ):
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
-    enter_button_name_message = await bot.send_message(
+    enter_button_name_message = await reply_menu.send_prompt(
         query.from_user.id, bot.phrases.admin.enter_name
     )
     await state.set_state(AddInlineMenuButtonState.waiting_name)
     await state.update_data(
-        dialog_messages=[enter_button_name_message], inline_menu_id=data.menu_id
+        dialog_messages=reply_menu.to_message_refs(enter_button_name_message),
+        inline_menu_id=data.menu_id,
     )
 
 
@@ -46,12 +48,18 @@ async def add_button_handler(
     AddInlineMenuButtonState.waiting_name, F.text, reply_menu.remove_messages
 )
 async def button_name_handler(
-    message: types.Message, state: FSMContext, bot_user: BotUser
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
 
     await InlineMenu.create(name=message.text, parent_id=state_data["inline_menu_id"])
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.button_name"
+    )
     parent = await InlineMenu.get(id=state_data["inline_menu_id"])
 
     dialog_messages = await reply_menu.send_reply_menu(
@@ -72,22 +80,29 @@ async def button_name_handler(
     markups.AdminInlineMenuCallbackData.filter(
         F.type == markups.AdminInlineMenuCallbackData.Type.child
     ),
-    reply_menu.remove_messages,
 )
 async def child_handler(
     query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
 ):
-    state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
     child = await InlineMenu.get(id=data.menu_id)
+    inline_markup = await markups.create_admin_inline_menu_markup(child)
+
+    if await reply_menu.edit_inline_menu(
+        query, state, bot_user, child, inline_markup=inline_markup, text=child.text
+    ):
+        return
+
+    await reply_menu.remove_messages(query, state)
+    state_data = await state.get_data()
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
 
     dialog_messages = await reply_menu.send_reply_menu(
         bot_user,
         menu,
         child,
         reply_markup=await markups.create_admin_reply_menu_markup(menu),
-        inline_markup=await markups.create_admin_inline_menu_markup(child),
+        inline_markup=inline_markup,
         text=child.text,
     )
 
@@ -102,10 +117,13 @@ async def child_handler(
     reply_menu.remove_messages,
 )
 async def remove_button_handler(
-    query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
+    query: types.CallbackQuery,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
     inline_menu = (
         await InlineMenu.filter(id=data.menu_id).prefetch_related("parent").first()
@@ -115,6 +133,9 @@ async def remove_button_handler(
         return
 
     await inline_menu.delete()
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.remove_button"
+    )
 
     dialog_messages = await reply_menu.send_reply_menu(
         bot_user,
@@ -136,10 +157,13 @@ async def remove_button_handler(
     reply_menu.remove_messages,
 )
 async def horizontal_alignment_handler(
-    query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
+    query: types.CallbackQuery,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
     inline_menu = await InlineMenu.get(id=data.menu_id)
     inline_menu.alignment = Alignment.horizontal
@@ -154,6 +178,9 @@ async def horizontal_alignment_handler(
     )
 
     await inline_menu.save()
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.horizontal_alignment"
+    )
     await state.update_data(dialog_messages=dialog_messages)
 
 
@@ -165,10 +192,13 @@ async def horizontal_alignment_handler(
     reply_menu.remove_messages,
 )
 async def vertical_alignment_handler(
-    query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
+    query: types.CallbackQuery,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
     inline_menu = await InlineMenu.get(id=data.menu_id)
     inline_menu.alignment = Alignment.vertical
@@ -183,6 +213,9 @@ async def vertical_alignment_handler(
     )
 
     await inline_menu.save()
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.vertical_alignment"
+    )
     await state.update_data(dialog_messages=dialog_messages)
 
 
@@ -197,12 +230,13 @@ async def add_url_button_handler(
     query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
 ):
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
-    enter_name_message = await bot.send_message(
+    enter_name_message = await reply_menu.send_prompt(
         bot_user.id, bot.phrases.admin.enter_name
     )
     await state.set_state(AddUrlButtonState.waiting_name)
     await state.update_data(
-        dialog_messages=[enter_name_message], inline_menu_id=data.menu_id
+        dialog_messages=reply_menu.to_message_refs(enter_name_message),
+        inline_menu_id=data.menu_id,
     )
 
 
@@ -210,21 +244,32 @@ async def add_url_button_handler(
 async def url_button_name_handler(
     message: types.Message, state: FSMContext, bot_user: BotUser
 ):
-    enter_url_message = await bot.send_message(bot_user.id, bot.phrases.admin.enter_url)
+    enter_url_message = await reply_menu.send_prompt(
+        bot_user.id, bot.phrases.admin.enter_url
+    )
     await state.set_state(AddUrlButtonState.waiting_url)
     await state.update_data(
-        dialog_messages=[message, enter_url_message], name=message.text
+        dialog_messages=reply_menu.to_message_refs(message, enter_url_message),
+        name=message.text,
     )
 
 
 @router.message(
     AddUrlButtonState.waiting_url, F.text.startswith("http"), reply_menu.remove_messages
 )
-async def url_handler(message: types.Message, state: FSMContext, bot_user: BotUser):
+async def url_handler(
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
+):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     parent = await InlineMenu.get(id=state_data["inline_menu_id"])
     await InlineMenu.create(parent=parent, url=message.text, name=state_data["name"])
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.url"
+    )
 
     dialog_messages = await reply_menu.send_reply_menu(
         bot_user,
@@ -250,10 +295,13 @@ async def remove_url_handler(
     query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
 ):
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
-    enter_url_message = await bot.send_message(bot_user.id, bot.phrases.admin.enter_url)
+    enter_url_message = await reply_menu.send_prompt(
+        bot_user.id, bot.phrases.admin.enter_url
+    )
     await state.set_state(RemoveUrlButtonState.waiting_url)
     await state.update_data(
-        dialog_messages=[enter_url_message], inline_menu_id=data.menu_id
+        dialog_messages=reply_menu.to_message_refs(enter_url_message),
+        inline_menu_id=data.menu_id,
     )
 
 
@@ -263,12 +311,18 @@ async def remove_url_handler(
     reply_menu.remove_messages,
 )
 async def url_remove_handler(
-    message: types.Message, state: FSMContext, bot_user: BotUser
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
     inline_menu = await InlineMenu.get(id=state_data["inline_menu_id"])
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     await InlineMenu.filter(url=message.text, parent=inline_menu).delete()
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.url_remove"
+    )
 
     dialog_messages = await reply_menu.send_reply_menu(
         bot_user,
@@ -295,13 +349,14 @@ async def edit_file_handler(
 ):
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
 
-    enter_file_message = await bot.send_message(
+    enter_file_message = await reply_menu.send_prompt(
         bot_user.id, bot.phrases.admin.enter_file
     )
 
     await state.set_state(EditFileState.waiting_file)
     await state.update_data(
-        dialog_messages=[enter_file_message], inline_menu_id=data.menu_id
+        dialog_messages=reply_menu.to_message_refs(enter_file_message),
+        inline_menu_id=data.menu_id,
     )
 
 
@@ -310,21 +365,27 @@ async def edit_file_handler(
     F.document | F.photo | F.video | F.animation,
     reply_menu.remove_messages,
 )
-async def file_handler(message: types.Message, state: FSMContext, bot_user: BotUser):
+async def file_handler(
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
+    blob_store_service: BlobStoreService,
+):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
 
-    inline_menu = (
-        await InlineMenu.filter(id=state_data["inline_menu_id"])
-        .prefetch_related("file")
-        .first()
-    )
+    inline_menu = await InlineMenu.get_or_none(id=state_data["inline_menu_id"])
 
     if inline_menu is None:
         return
 
-    if inline_menu.file is not None:
-        await inline_menu.file.delete()
+    old_file = await MessageFile.only_metadata().get_or_none(
+        inline_menu_id=inline_menu.id
+    )
+
+    if old_file is not None:
+        await old_file.delete()
 
     if message.content_type == "document":
         attachment = message.document
@@ -339,17 +400,32 @@ async def file_handler(message: types.Message, state: FSMContext, bot_user: BotU
 
     if attachment is not None:
         file = await bot.get_file(attachment.file_id)
-        file_buffer: BinaryIO = await bot.download(attachment)  # type: ignore
-        file_buffer.seek(0)
-
         filepath = Path(file.file_path)  # type: ignore
+        content_hash, size = await blob_store_service.put_stream(
+            bot.stream_file(file.file_path)  # type: ignore
+        )
+
+        # the received file_id is reusable as long as we send it the same way
+        if reply_menu.decide_file_content_type(filepath.name) == message.content_type:
+            telegram_file_id = attachment.file_id
+        else:
+            telegram_file_id = None
 
         await MessageFile.create(
             filename=filepath.name,
-            bytes=file_buffer.read(),
+            content_hash=content_hash,
+            size=size,
+            telegram_file_id=telegram_file_id,
             inline_menu=inline_menu,
         )
 
+    if old_file is not None and old_file.content_hash:
+        await blob_store_service.release(old_file.content_hash)
+
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.file"
+    )
+
     dialog_messages = await reply_menu.send_reply_menu(
         bot_user,
         menu,
@@ -371,13 +447,27 @@ async def file_handler(message: types.Message, state: FSMContext, bot_user: BotU
     reply_menu.remove_messages,
 )
 async def remove_file_handler(
-    query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
+    query: types.CallbackQuery,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
+    blob_store_service: BlobStoreService,
 ):
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     inline_menu = await InlineMenu.get(id=data.menu_id)
+    content_hashes = await MessageFile.filter(inline_menu=inline_menu).values_list(
+        "content_hash", flat=True
+    )
     await MessageFile.filter(inline_menu=inline_menu).delete()
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.remove_file"
+    )
+
+    for content_hash in content_hashes:
+        if content_hash:
+            await blob_store_service.release(content_hash)
 
     dialog_messages = await reply_menu.send_reply_menu(
         bot_user,
@@ -402,22 +492,31 @@ async def edit_text_handler(
     query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
 ):
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
-    enter_text_message = await bot.send_message(
+    enter_text_message = await reply_menu.send_prompt(
         bot_user.id, bot.phrases.admin.enter_text
     )
     await state.set_state(EditTextState.waiting_text)
     await state.update_data(
-        dialog_messages=[enter_text_message], inline_menu_id=data.menu_id
+        dialog_messages=reply_menu.to_message_refs(enter_text_message),
+        inline_menu_id=data.menu_id,
     )
 
 
 @router.message(EditTextState.waiting_text, F.text, reply_menu.remove_messages)
-async def text_handler(message: types.Message, state: FSMContext, bot_user: BotUser):
+async def text_handler(
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
+):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     inline_menu = await InlineMenu.get(id=state_data["inline_menu_id"])
     inline_menu.text = message.html_text  # type: ignore
     await inline_menu.save()
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.text"
+    )
 
     dialog_messages = await reply_menu.send_reply_menu(
         bot_user,
@@ -443,12 +542,13 @@ async def edit_back_button_text_handler(
     query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
 ):
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
-    enter_text_message = await bot.send_message(
+    enter_text_message = await reply_menu.send_prompt(
         bot_user.id, bot.phrases.admin.enter_text
     )
     await state.set_state(EditBackButtonTextState.waiting_text)
     await state.update_data(
-        dialog_messages=[enter_text_message], inline_menu_id=data.menu_id
+        dialog_messages=reply_menu.to_message_refs(enter_text_message),
+        inline_menu_id=data.menu_id,
     )
 
 
@@ -456,10 +556,13 @@ async def edit_back_button_text_handler(
     EditBackButtonTextState.waiting_text, F.text, reply_menu.remove_messages
 )
 async def back_button_text_handler(
-    message: types.Message, state: FSMContext, bot_user: BotUser
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     inline_menu = await InlineMenu.get(id=state_data["inline_menu_id"])
     inline_menu.back_button_text = message.text  # type: ignore
 
@@ -473,6 +576,9 @@ async def back_button_text_handler(
     )
 
     await inline_menu.save()
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.back_button_text"
+    )
     await state.set_state(AdminReplyMenuState.waiting_action)
     await state.update_data(dialog_messages=dialog_messages)
 
@@ -488,19 +594,25 @@ async def edit_name_handler(
     query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
 ):
     data = markups.AdminInlineMenuCallbackData.unpack(query.data)  # type: ignore
-    enter_name_message = await bot.send_message(
+    enter_name_message = await reply_menu.send_prompt(
         bot_user.id, bot.phrases.admin.enter_name
     )
     await state.set_state(EditNameState.waiting_name)
     await state.update_data(
-        dialog_messages=[enter_name_message], inline_menu_id=data.menu_id
+        dialog_messages=reply_menu.to_message_refs(enter_name_message),
+        inline_menu_id=data.menu_id,
     )
 
 
 @router.message(EditNameState.waiting_name, F.text, reply_menu.remove_messages)
-async def name_handler(message: types.Message, state: FSMContext, bot_user: BotUser):
+async def name_handler(
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
+):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     inline_menu = await InlineMenu.get(id=state_data["inline_menu_id"])
     inline_menu.name = message.text  # type: ignore
 
@@ -513,5 +625,8 @@ async def name_handler(message: types.Message, state: FSMContext, bot_user: BotU
     )
 
     await inline_menu.save()
+    await reply_menu.refresh_after_admin_edit(
+        menu_tree_service, bot_user, "inline_menu.name"
+    )
     await state.set_state(AdminReplyMenuState.waiting_action)
     await state.update_data(dialog_messages=dialog_mesages)
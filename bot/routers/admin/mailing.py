@@ -1,42 +1,105 @@
-﻿from aiogram import F, types
+﻿from typing import Any, Dict
+
+from aiogram import F, types
 from aiogram3_form import Form, FormField
 from aiogram.filters.command import Command
 from aiogram.fsm.context import FSMContext
+from aiogram.methods import SendMessage
 
+from ... import markups
 from ...bot import bot
-from ...services.database.models import BotUser
-from . import router
+from ...services.database.models import MailingJob
+from ...services.mailing import MailingService, format_mailing_status
+from . import reply_menu, router
+
+MAILINGS_LIST_LIMIT = 20
+
+
+async def send_enter_mailing_message(
+    chat_id: int, user_id: int, form_data: Dict[str, Any]
+):
+    # phrases are read when the form is shown, so reloaded phrases apply
+    await reply_menu.get_outbox_service().submit(
+        SendMessage(
+            chat_id=chat_id,
+            text=bot.phrases.admin.enter_mailing_message_text,
+            reply_markup=types.ReplyKeyboardRemove(remove_keyboard=True),
+        )
+    )
 
 
 class MailingForm(Form, router=router):
     message: types.Message = FormField(
-        enter_message_text=bot.phrases.admin.enter_mailing_message_text,
-        filter=F.func(lambda m: m),
+        enter_callback=send_enter_mailing_message, filter=F.func(lambda m: m)
     )
 
 
 @MailingForm.submit()
-async def mailing_form_submit_handler(form: MailingForm):
+async def mailing_form_submit_handler(
+    form: MailingForm, mailing_service: MailingService
+):
     await form.answer(bot.phrases.admin.mailing_started_message_text)
+    await mailing_service.start(
+        form.message.chat.id, form.message.chat.id, form.message.message_id
+    )
 
-    all_bot_users = await BotUser.all()
-    sent_messages_count = 0
 
-    for bot_user in all_bot_users:
-        try:
-            await form.message.copy_to(bot_user.id)
-        except Exception:
-            continue
+@router.message(Command("mail"))
+async def mail_command_handler(message: types.Message, state: FSMContext):
+    # the form removes the reply keyboard
+    reply_menu.forget_reply_markup(message.chat.id)
+    await MailingForm.start(state)
 
-        sent_messages_count += 1
 
-    await form.answer(
-        bot.phrases.admin.sent_messages_message_text_fmt.format(
-            sent_messages_count=sent_messages_count
-        )
-    )
+@router.callback_query(markups.MailingCallbackData.filter())
+async def mailing_action_handler(
+    query: types.CallbackQuery, mailing_service: MailingService
+):
+    data = markups.MailingCallbackData.unpack(query.data)  # type: ignore
 
+    if data.action == markups.MailingCallbackData.Action.pause:
+        await mailing_service.pause(data.mailing_id)
+    elif data.action == markups.MailingCallbackData.Action.resume:
+        await mailing_service.resume(data.mailing_id)
+    else:
+        await mailing_service.cancel(data.mailing_id)
 
-@router.message(Command("mail"))
-async def mail_command_handler(_, state: FSMContext):
-    await MailingForm.start(state)
+    await query.answer()
+
+
+@router.message(Command("mailings"))
+async def mailings_command_handler(
+    message: types.Message, mailing_service: MailingService
+):
+    mailing_jobs = await MailingJob.all().order_by("-id").limit(MAILINGS_LIST_LIMIT)
+
+    if not mailing_jobs:
+        return await message.answer(bot.phrases.admin.no_mailings)
+
+    lines = []
+
+    for mailing_job in mailing_jobs:
+        # running mailings are ahead of their last flushed counters
+        if mailing := mailing_service.mailings.get(mailing_job.id):
+            status = mailing.status
+            processed_count = mailing.processed_count
+        else:
+            status = mailing_job.status
+            processed_count = (
+                mailing_job.sent_count
+                + mailing_job.blocked_count
+                + mailing_job.not_found_count
+                + mailing_job.failed_count
+            )
+
+        lines.append(
+            bot.phrases.admin.mailing_list_item_fmt.format(
+                id=mailing_job.id,
+                created_at=mailing_job.created_at,
+                status=format_mailing_status(status),
+                processed_count=processed_count,
+                total_count=mailing_job.total_count,
+            )
+        )
+
+    await message.answer("\n".join(lines))
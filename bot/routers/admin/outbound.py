@@ -0,0 +1,20 @@
+﻿from dataclasses import asdict
+
+from aiogram import types
+from aiogram.filters.command import Command
+
+from ...bot import bot
+from . import router
+
+
+@router.message(Command("outbound"))
+async def outbound_command_handler(message: types.Message):
+    lane_lines = [
+        bot.phrases.admin.outbound_lane_fmt.format(lane=lane.name, **asdict(stats))
+        for lane, stats in bot.rate_limiter.lanes.items()
+    ]
+    await message.answer(
+        bot.phrases.admin.outbound_stats_message_text_fmt.format(
+            lanes="\n".join(lane_lines), **asdict(bot.rate_limiter.stats)
+        )
+    )
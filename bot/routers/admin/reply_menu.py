@@ -1,12 +1,28 @@
 ﻿import asyncio
-from typing import List, Optional, Union
+import hashlib
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, Union
 
 from aiogram import F, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
+from aiogram.methods import (
+    EditMessageMedia,
+    EditMessageText,
+    SendAnimation,
+    SendDocument,
+    SendMessage,
+    SendPhoto,
+    SendVideo,
+)
 
 from ... import markups
-from ...bot import bot
+from ...bot import bot, dispatcher
+from ...filters.phrase import PhraseFilter
+from ...services.blob_store import BlobStoreService
 from ...services.database.models import BotUser, InlineMenu, MessageFile, ReplyMenu
+from ...services.menu_tree import MenuTreeService
+from ...services.menu_tree.nodes import InlineMenuNode, ReplyMenuNode
+from ...services.outbox import OutboxService
 from ...state import (
     AddReplyMenuButtonState,
     AdminReplyMenuState,
@@ -14,78 +30,305 @@ from ...state import (
     EditReplyButtonNameState,
 )
 from ...utils.enums import Alignment
+from ...utils.lru_cache import LRUCache
 from . import router
 
+MessageRef = Tuple[int, int]  # (chat id, message id)
+
+# chat id -> digest of the reply keyboard currently shown in that chat
+shown_reply_markups: LRUCache[int, str] = LRUCache(maxsize=100_000)
 
-def decide_file_send_method(input_file: types.BufferedInputFile):
-    filename: str = input_file.filename.lower()  # type: ignore
+
+def decide_file_content_type(filename: str):
+    filename = filename.lower()
 
     if filename.endswith(".png") or filename.endswith(".jpg"):
-        return bot.send_photo
+        return "photo"
 
     if filename.endswith(".gif"):
-        return bot.send_animation
+        return "animation"
 
     if filename.endswith(".mp4"):
-        return bot.send_video
+        return "video"
+
+    return "document"
+
+
+def get_message_file_id(message: types.Message) -> Optional[str]:
+    if message.photo:
+        return message.photo[-1].file_id
+
+    attachment = message.video or message.animation or message.document
+    return attachment.file_id if attachment else None
 
-    return bot.send_document
+
+INPUT_MEDIA_TYPES = {
+    "photo": types.InputMediaPhoto,
+    "animation": types.InputMediaAnimation,
+    "video": types.InputMediaVideo,
+    "document": types.InputMediaDocument,
+}
+
+SEND_METHOD_TYPES = {
+    "photo": SendPhoto,
+    "animation": SendAnimation,
+    "video": SendVideo,
+    "document": SendDocument,
+}
+
+
+def get_outbox_service():
+    return dispatcher.services.get(OutboxService)
+
+
+async def refresh_after_admin_edit(
+    menu_tree_service: MenuTreeService, bot_user: BotUser, action: str
+):
+    await menu_tree_service.refresh()
+    dispatcher.journal.record("admin_edit", action=action, user_id=bot_user.id)
+
+
+def send_prompt(chat_id: int, text: str) -> "asyncio.Future[types.Message]":
+    # through the outbox, so it can not overtake the screen queued before it
+    return get_outbox_service().submit(SendMessage(chat_id=chat_id, text=text))
+
+
+def is_message_not_modified(error: TelegramBadRequest):
+    return "message is not modified" in error.message
+
+
+def to_message_refs(*messages: types.Message) -> List[MessageRef]:
+    return [(m.chat.id, m.message_id) for m in messages]
+
+
+def get_markup_digest(markup: types.ReplyKeyboardMarkup):
+    return hashlib.sha1(markup.json(exclude_none=True).encode()).hexdigest()
+
+
+def forget_reply_markup(chat_id: int):
+    shown_reply_markups.pop(chat_id)
+
+
+def format_menu_text(bot_user: BotUser, text: Optional[str]):
+    return (text or bot.phrases.admin.set_message_in_admin).format(bot_user=bot_user)
+
+
+async def get_inline_menu_file(inline_menu: Union[InlineMenu, InlineMenuNode]):
+    if isinstance(inline_menu, InlineMenu):
+        return await MessageFile.only_metadata().get_or_none(
+            inline_menu_id=inline_menu.id
+        )
+
+    return inline_menu.file
+
+
+async def get_message_file_input(message_file: MessageFile):
+    if message_file.content_hash:
+        blob_store_service = dispatcher.services.get(BlobStoreService)
+        return blob_store_service.input_file(
+            message_file.content_hash, message_file.filename
+        )
+
+    return types.BufferedInputFile(
+        await message_file.read_bytes(), message_file.filename  # type: ignore
+    )
+
+
+async def call_with_message_file(
+    message_file: MessageFile,
+    call: Callable[[Union[str, types.InputFile]], Awaitable[Any]],
+):
+    if message_file.telegram_file_id:
+        try:
+            return await call(message_file.telegram_file_id)
+        except TelegramBadRequest as e:
+            if is_message_not_modified(e):
+                raise
+
+            # file_id was rejected, fall back to uploading the bytes
+
+    result = await call(await get_message_file_input(message_file))
+
+    if isinstance(result, types.Message):
+        message_file.telegram_file_id = get_message_file_id(result)
+        await MessageFile.filter(id=message_file.id).update(
+            telegram_file_id=message_file.telegram_file_id
+        )
+
+    return result
+
+
+async def send_message_file(
+    chat_id: int,
+    message_file: MessageFile,
+    *,
+    caption: str,
+    reply_markup: Union[types.ReplyKeyboardMarkup, types.InlineKeyboardMarkup],
+):
+    content_type = decide_file_content_type(message_file.filename)
+    send_method_type = SEND_METHOD_TYPES[content_type]
+    outbox_service = get_outbox_service()
+
+    return await call_with_message_file(
+        message_file,
+        lambda media: outbox_service.submit(
+            send_method_type(
+                chat_id=chat_id,
+                caption=caption,
+                reply_markup=reply_markup,
+                **{content_type: media},
+            )
+        ),
+    )
 
 
 async def send_reply_menu(
     bot_user: BotUser,
-    reply_menu: ReplyMenu,
-    inline_menu: InlineMenu,
+    reply_menu: Union[ReplyMenu, ReplyMenuNode],
+    inline_menu: Union[InlineMenu, InlineMenuNode],
     *,
     reply_markup: types.ReplyKeyboardMarkup,
     inline_markup: Optional[types.InlineKeyboardMarkup] = None,
     text: Optional[str] = None,
 ):
-    await inline_menu.fetch_related("file")
-
-    message_text = (text or bot.phrases.admin.set_message_in_admin).format(
-        bot_user=bot_user
+    dispatcher.journal.record(
+        "menu_rendered",
+        user_id=bot_user.id,
+        reply_menu_id=reply_menu.id,
+        inline_menu_id=inline_menu.id,
+        edited=False,
     )
+    message_file = await get_inline_menu_file(inline_menu)
+    message_text = format_menu_text(bot_user, text)
+    reply_markup_digest = get_markup_digest(reply_markup)
+    outbox_service = get_outbox_service()
 
     if inline_markup is None:
-        if inline_menu is None or inline_menu.file is None:
-            return [
-                await bot.send_message(
-                    bot_user.id, message_text, reply_markup=reply_markup
+        shown_reply_markups.set(bot_user.id, reply_markup_digest)
+
+        if message_file is None:
+            return to_message_refs(
+                await outbox_service.submit(
+                    SendMessage(
+                        chat_id=bot_user.id,
+                        text=message_text,
+                        reply_markup=reply_markup,
+                    )
                 )
-            ]
-
-        input_file = types.BufferedInputFile(
-            inline_menu.file.bytes, inline_menu.file.filename
-        )
+            )
 
-        send_method = decide_file_send_method(input_file)
-        return [
-            await send_method(
-                bot_user.id, input_file, caption=message_text, reply_markup=reply_markup
+        return to_message_refs(
+            await send_message_file(
+                bot_user.id,
+                message_file,
+                caption=message_text,
+                reply_markup=reply_markup,
             )
-        ]
+        )
 
-    reply_markup_message = await bot.send_message(
-        bot_user.id,
-        bot.phrases.loading_message.format(bot_user=bot_user),
-        reply_markup=reply_markup,
-    )
+    reply_markup_message_future: Optional["asyncio.Future[types.Message]"] = None
 
-    if inline_menu and inline_menu.file:
-        input_file = types.BufferedInputFile(
-            inline_menu.file.bytes, inline_menu.file.filename
+    # the keyboard stays after its message is deleted, so only send it on change;
+    # both messages are queued at once, the outbox keeps them in order
+    if shown_reply_markups.get(bot_user.id) != reply_markup_digest:
+        reply_markup_message_future = outbox_service.submit(
+            SendMessage(
+                chat_id=bot_user.id,
+                text=bot.phrases.loading_message.format(bot_user=bot_user),
+                reply_markup=reply_markup,
+            )
         )
-        send_method = decide_file_send_method(input_file)
-        inline_markup_message = await send_method(
-            bot_user.id, input_file, caption=message_text, reply_markup=inline_markup
+
+    if message_file is not None:
+        inline_markup_message = await send_message_file(
+            bot_user.id,
+            message_file,
+            caption=message_text,
+            reply_markup=inline_markup,
         )
     else:
-        inline_markup_message = await bot.send_message(
-            bot_user.id, message_text, reply_markup=inline_markup
+        inline_markup_message = await outbox_service.submit(
+            SendMessage(
+                chat_id=bot_user.id, text=message_text, reply_markup=inline_markup
+            )
         )
 
-    return [inline_markup_message, reply_markup_message]
+    dialog_messages: List[types.Message] = [inline_markup_message]
+
+    if reply_markup_message_future is not None:
+        dialog_messages.append(await reply_markup_message_future)
+        shown_reply_markups.set(bot_user.id, reply_markup_digest)
+
+    return to_message_refs(*dialog_messages)
+
+
+async def edit_inline_menu(
+    query: types.CallbackQuery,
+    state: FSMContext,
+    bot_user: BotUser,
+    inline_menu: Union[InlineMenu, InlineMenuNode],
+    *,
+    inline_markup: types.InlineKeyboardMarkup,
+    text: Optional[str] = None,
+):
+    # returns False when the pressed message can not be edited and must be resent
+    message = query.message
+    state_data = await state.get_data()
+    dialog_messages: List[MessageRef] = state_data.get("dialog_messages") or []
+
+    if message is None or not any(
+        message_id == message.message_id for _, message_id in dialog_messages
+    ):
+        return False
+
+    message_file = await get_inline_menu_file(inline_menu)
+    message_text = format_menu_text(bot_user, text)
+
+    if message_file is None:
+        content_type = "text"
+    else:
+        content_type = decide_file_content_type(message_file.filename)
+
+    if content_type != message.content_type:
+        return False
+
+    outbox_service = get_outbox_service()
+
+    try:
+        if message_file is None:
+            await outbox_service.submit(
+                EditMessageText(
+                    text=message_text,
+                    chat_id=message.chat.id,
+                    message_id=message.message_id,
+                    reply_markup=inline_markup,
+                )
+            )
+        else:
+            input_media_type = INPUT_MEDIA_TYPES[content_type]
+            await call_with_message_file(
+                message_file,
+                lambda media: outbox_service.submit(
+                    EditMessageMedia(
+                        media=input_media_type(media=media, caption=message_text),
+                        chat_id=message.chat.id,
+                        message_id=message.message_id,
+                        reply_markup=inline_markup,
+                    )
+                ),
+            )
+    except TelegramBadRequest as e:
+        if not is_message_not_modified(e):
+            return False
+
+    dispatcher.journal.record(
+        "menu_rendered",
+        user_id=bot_user.id,
+        reply_menu_id=None,
+        inline_menu_id=inline_menu.id,
+        edited=True,
+    )
+    return True
 
 
 async def send_admin_reply_menu(bot_user: BotUser, reply_menu: ReplyMenu):
@@ -103,9 +346,14 @@ async def send_admin_reply_menu(bot_user: BotUser, reply_menu: ReplyMenu):
     )
 
 
-async def child_button_filter(message: types.Message, state: FSMContext):
+async def child_button_filter(
+    message: types.Message, state: FSMContext, menu_tree_service: MenuTreeService
+):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = menu_tree_service.get_reply_menu(state_data["menu_id"])
+
+    if menu is None:
+        return False
 
     for child in menu.children:
         if child.name == message.text:
@@ -118,66 +366,73 @@ async def remove_messages(
     message_or_query: Union[types.Message, types.CallbackQuery], state: FSMContext
 ):
     state_data = await state.get_data()
+    message_refs: List[MessageRef] = list(state_data.get("dialog_messages") or [])
 
     if isinstance(message_or_query, types.Message):
-        messages: List[types.Message] = [message_or_query]
-    else:
-        messages: List[types.Message] = []
+        message_refs.extend(to_message_refs(message_or_query))
 
-    if dialog_messages := state_data.get("dialog_messages"):
-        messages.extend(dialog_messages)
+    # deleted in the background, so the next screen is not waiting for it
+    if message_refs:
+        outbox_service = get_outbox_service()
 
-    if messages:
-        await asyncio.gather(
-            *(bot.delete_message(m.chat.id, m.message_id) for m in messages),
-            return_exceptions=True,
-        )
+        for chat_id in {chat_id for chat_id, _ in message_refs}:
+            outbox_service.delete(
+                chat_id, [m_id for c_id, m_id in message_refs if c_id == chat_id]
+            )
 
     await state.update_data(dialog_messages=[])
     return True
 
 
-async def back_button_filter(message: types.Message, state: FSMContext):
+async def back_button_filter(
+    message: types.Message, state: FSMContext, menu_tree_service: MenuTreeService
+):
     if message.text == bot.phrases.back:
         return True
 
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
-    return message.text == menu.back_button_text
+    menu = menu_tree_service.get_reply_menu(state_data["menu_id"])
+    return menu is not None and message.text == menu.back_button_text
 
 
 @router.message(
     AdminReplyMenuState.waiting_action,
-    F.text == bot.phrases.admin.add_button,
+    PhraseFilter("admin.add_button"),
     remove_messages,
 )
 async def add_button_handler(message: types.Message, state: FSMContext):
-    enter_name_message = await message.answer(bot.phrases.admin.enter_name)
+    enter_name_message = await send_prompt(
+        message.chat.id, bot.phrases.admin.enter_name
+    )
     await state.set_state(AddReplyMenuButtonState.waiting_name)
-    await state.update_data(dialog_messages=[enter_name_message])
+    await state.update_data(dialog_messages=to_message_refs(enter_name_message))
 
 
 @router.message(
     AdminReplyMenuState.waiting_action, F.text, child_button_filter, remove_messages
 )
 async def child_button_handler(
-    message: types.Message, state: FSMContext, child: ReplyMenu, bot_user: BotUser
+    message: types.Message, state: FSMContext, child: ReplyMenuNode, bot_user: BotUser
 ):
-    dialog_messages = await send_admin_reply_menu(bot_user, child)
-    state_data = await state.get_data()
-    state_data["dialog_messages"].extend(dialog_messages)
-    state_data["menu"] = child
-    await state.set_data(state_data)
+    child_menu = await ReplyMenu.get(id=child.id)
+    dialog_messages = await send_admin_reply_menu(bot_user, child_menu)
+    await state.update_data(menu_id=child.id, dialog_messages=dialog_messages)
 
 
 @router.message(AddReplyMenuButtonState.waiting_name, F.text, remove_messages)
 async def add_button_text_handler(
-    message: types.Message, state: FSMContext, bot_user: BotUser
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     inline_menu = await InlineMenu.create()
     await ReplyMenu.create(name=message.text, parent=menu, inline_menu=inline_menu)
+    await refresh_after_admin_edit(
+        menu_tree_service, bot_user, "reply_menu.add_button_text"
+    )
     dialog_messages = await send_admin_reply_menu(bot_user, menu)
     await state.set_state(AdminReplyMenuState.waiting_action)
     await state.update_data(dialog_messages=dialog_messages)
@@ -185,116 +440,146 @@ async def add_button_text_handler(
 
 @router.message(
     AdminReplyMenuState.waiting_action,
-    F.text == bot.phrases.admin.remove_button,
+    PhraseFilter("admin.remove_button"),
     remove_messages,
 )
 async def remove_button_handler(
-    message: types.Message, state: FSMContext, bot_user: BotUser
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"]).prefetch_related("parent")
 
     if menu.parent is None:
         return
 
     await menu.delete()
+    await refresh_after_admin_edit(
+        menu_tree_service, bot_user, "reply_menu.remove_button"
+    )
     dialog_messages = await send_admin_reply_menu(bot_user, menu.parent)
-    await state.update_data(menu=menu.parent, dialog_messages=dialog_messages)
+    await state.update_data(menu_id=menu.parent.id, dialog_messages=dialog_messages)
 
 
 @router.message(AdminReplyMenuState.waiting_action, back_button_filter, remove_messages)
 async def back_handler(message: types.Message, state: FSMContext, bot_user: BotUser):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"]).prefetch_related("parent")
 
     if menu.parent is None:
         return
 
     dialog_messages = await send_admin_reply_menu(bot_user, menu.parent)
-    await state.update_data(menu=menu.parent, dialog_messages=dialog_messages)
+    await state.update_data(menu_id=menu.parent.id, dialog_messages=dialog_messages)
 
 
 @router.message(
     AdminReplyMenuState.waiting_action,
-    F.text == bot.phrases.admin.buttons_horizontal,
+    PhraseFilter("admin.buttons_horizontal"),
     remove_messages,
 )
 async def buttons_horizontal_handler(
-    message: types.Message, state: FSMContext, bot_user: BotUser
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     menu.alignment = Alignment.horizontal
     dialog_messages = await send_admin_reply_menu(bot_user, menu)
     await state.update_data(dialog_messages=dialog_messages)
     await menu.save()
+    await refresh_after_admin_edit(
+        menu_tree_service, bot_user, "reply_menu.buttons_horizontal"
+    )
 
 
 @router.message(
     AdminReplyMenuState.waiting_action,
-    F.text == bot.phrases.admin.buttons_vertical,
+    PhraseFilter("admin.buttons_vertical"),
     remove_messages,
 )
 async def buttons_vertical_handler(
-    message: types.Message, state: FSMContext, bot_user: BotUser
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     menu.alignment = Alignment.vertical
     dialog_messages = await send_admin_reply_menu(bot_user, menu)
     await state.update_data(dialog_messages=dialog_messages)
     await menu.save()
+    await refresh_after_admin_edit(
+        menu_tree_service, bot_user, "reply_menu.buttons_vertical"
+    )
 
 
 @router.message(
     AdminReplyMenuState.waiting_action,
-    F.text == bot.phrases.admin.edit_back_button_text,
+    PhraseFilter("admin.edit_back_button_text"),
     remove_messages,
 )
 async def edit_back_button_text_handler(
     message: types.Message, state: FSMContext, bot_user: BotUser
 ):
-    enter_text_message = await bot.send_message(
+    enter_text_message = await send_prompt(
         bot_user.id, bot.phrases.admin.enter_text
     )
     await state.set_state(EditReplyBackButtonTextState.waiting_text)
-    await state.update_data(dialog_messages=[enter_text_message])
+    await state.update_data(dialog_messages=to_message_refs(enter_text_message))
 
 
 @router.message(EditReplyBackButtonTextState.waiting_text, F.text, remove_messages)
 async def back_button_text_handler(
-    message: types.Message, state: FSMContext, bot_user: BotUser
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     menu.back_button_text = message.text  # type: ignore
     dialog_messages = await send_admin_reply_menu(bot_user, menu)
     await state.set_state(AdminReplyMenuState.waiting_action)
     await state.update_data(dialog_messages=dialog_messages)
     await menu.save()
+    await refresh_after_admin_edit(
+        menu_tree_service, bot_user, "reply_menu.back_button_text"
+    )
 
 
 @router.message(
     AdminReplyMenuState.waiting_action,
-    F.text == bot.phrases.admin.edit_name,
+    PhraseFilter("admin.edit_name"),
     remove_messages,
 )
 async def edit_name_handler(
     message: types.Message, state: FSMContext, bot_user: BotUser
 ):
-    enter_name_message = await bot.send_message(
+    enter_name_message = await send_prompt(
         bot_user.id, bot.phrases.admin.enter_name
     )
     await state.set_state(EditReplyButtonNameState.waiting_name)
-    await state.update_data(dialog_messages=[enter_name_message])
+    await state.update_data(dialog_messages=to_message_refs(enter_name_message))
 
 
 @router.message(EditReplyButtonNameState.waiting_name, F.text, remove_messages)
-async def name_handler(message: types.Message, state: FSMContext, bot_user: BotUser):
+async def name_handler(
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
+):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = await ReplyMenu.get(id=state_data["menu_id"])
     menu.name = message.text  # type: ignore
     await state.set_state(AdminReplyMenuState.waiting_action)
     dialog_messages = await send_admin_reply_menu(bot_user, menu)
     await state.update_data(dialog_messages=dialog_messages)
     await menu.save()
+    await refresh_after_admin_edit(menu_tree_service, bot_user, "reply_menu.name")
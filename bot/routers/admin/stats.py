@@ -0,0 +1,72 @@
+﻿from datetime import datetime, timedelta, timezone
+
+from aiogram import types
+from aiogram.filters.command import Command, CommandObject
+
+from ...bot import bot
+from ...services.analytics import AnalyticsService
+from ...services.menu_tree import MenuTreeService
+from ...utils.enums import ClickNodeType
+from . import router
+
+DEFAULT_STATS_HOURS = 24
+TOP_NODES_LIMIT = 10
+
+
+def get_node_name(
+    menu_tree_service: MenuTreeService, node_type: ClickNodeType, node_id: int
+):
+    if node_type == ClickNodeType.inline_menu:
+        node = menu_tree_service.get_inline_menu(node_id)
+    else:
+        node = menu_tree_service.get_reply_menu(node_id)
+
+    # removed nodes keep their clicks
+    name = node.name if node and node.name else f"#{node_id}"
+
+    if node_type == ClickNodeType.back:
+        return f"{bot.phrases.back} ({name})"
+
+    return name
+
+
+@router.message(Command("stats"))
+async def stats_command_handler(
+    message: types.Message,
+    command: CommandObject,
+    analytics_service: AnalyticsService,
+    menu_tree_service: MenuTreeService,
+):
+    hours = command.args.strip() if command.args else str(DEFAULT_STATS_HOURS)
+
+    if not hours.isdigit():
+        return await message.answer(bot.phrases.admin.stats_usage)
+
+    since = datetime.now(timezone.utc) - timedelta(hours=int(hours))
+    stats = await analytics_service.get_stats(since)
+
+    total_stats = stats.pop((ClickNodeType.any, 0), None)
+    start_stats = stats.pop((ClickNodeType.start, 0), None)
+    top_nodes = sorted(stats.items(), key=lambda i: i[1].clicks_count, reverse=True)
+
+    top_node_lines = [
+        bot.phrases.admin.stats_node_fmt.format(
+            position=position,
+            name=get_node_name(menu_tree_service, node_type, node_id),
+            clicks_count=node_stats.clicks_count,
+            users_count=len(node_stats.users),
+        )
+        for position, ((node_type, node_id), node_stats) in enumerate(
+            top_nodes[:TOP_NODES_LIMIT], 1
+        )
+    ]
+
+    await message.answer(
+        bot.phrases.admin.stats_message_text_fmt.format(
+            hours=hours,
+            users_count=len(total_stats.users) if total_stats else 0,
+            clicks_count=total_stats.clicks_count if total_stats else 0,
+            start_count=start_stats.clicks_count if start_stats else 0,
+            top_nodes="\n".join(top_node_lines),
+        )
+    )
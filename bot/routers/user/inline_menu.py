@@ -2,8 +2,11 @@
 from aiogram.fsm.context import FSMContext
 
 from ... import markups
-from ...services.database.models import BotUser, InlineMenu, ReplyMenu
+from ...services.analytics import AnalyticsService
+from ...services.database.models import BotUser
+from ...services.menu_tree import MenuTreeService
 from ...state import UserMenuState
+from ...utils.enums import ClickNodeType
 from ..admin import reply_menu as admin_reply_menu
 from . import router
 
@@ -13,25 +16,42 @@ from . import router
     markups.UserInlineMenuCallbackData.filter(
         F.type == markups.UserInlineMenuCallbackData.Type.child
     ),
-    admin_reply_menu.remove_messages,
 )
 async def child_button_handler(
-    query: types.CallbackQuery, state: FSMContext, bot_user: BotUser
+    query: types.CallbackQuery,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
+    analytics_service: AnalyticsService,
 ):
     data = markups.UserInlineMenuCallbackData.unpack(query.data)  # type: ignore
-    state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
-    child = await InlineMenu.filter(id=data.menu_id).prefetch_related("parent").first()
+    child = menu_tree_service.get_inline_menu(data.menu_id)
 
     if child is None:
         return
 
+    analytics_service.track(ClickNodeType.inline_menu, child.id, bot_user.id)
+
+    inline_markup = markups.create_user_inline_menu_markup(child)
+
+    if await admin_reply_menu.edit_inline_menu(
+        query, state, bot_user, child, inline_markup=inline_markup, text=child.text
+    ):
+        return
+
+    await admin_reply_menu.remove_messages(query, state)
+    state_data = await state.get_data()
+    menu = (
+        menu_tree_service.get_reply_menu(state_data["menu_id"])
+        or menu_tree_service.root_menu
+    )
+
     dialog_messages = await admin_reply_menu.send_reply_menu(
         bot_user,
         menu,
         child,
-        reply_markup=await markups.create_user_reply_menu_markup(menu),
-        inline_markup=await markups.create_user_inline_menu_markup(child),
+        reply_markup=markups.create_user_reply_menu_markup(menu),
+        inline_markup=inline_markup,
         text=child.text,
     )
 
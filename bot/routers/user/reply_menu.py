@@ -4,21 +4,22 @@ from bot.state import UserMenuState
 
 from ... import markups
 from ...bot import bot
-from ...services.database.models import BotUser, ReplyMenu
+from ...services.analytics import AnalyticsService
+from ...services.database.models import BotUser
+from ...services.menu_tree import MenuTreeService
+from ...services.menu_tree.nodes import ReplyMenuNode
+from ...utils.enums import ClickNodeType
 from ..admin import reply_menu as admin_reply_menu
 from . import router
 
 
-async def send_user_reply_menu(bot_user: BotUser, reply_menu: ReplyMenu):
-    await reply_menu.fetch_related("inline_menu")
+async def send_user_reply_menu(bot_user: BotUser, reply_menu: ReplyMenuNode):
     return await admin_reply_menu.send_reply_menu(
         bot_user,
         reply_menu,
         reply_menu.inline_menu,
-        reply_markup=await markups.create_user_reply_menu_markup(reply_menu),
-        inline_markup=await markups.create_user_inline_menu_markup(
-            reply_menu.inline_menu
-        ),
+        reply_markup=markups.create_user_reply_menu_markup(reply_menu),
+        inline_markup=markups.create_user_inline_menu_markup(reply_menu.inline_menu),
         text=reply_menu.inline_menu.text,
     )
 
@@ -29,23 +30,27 @@ async def send_user_reply_menu(bot_user: BotUser, reply_menu: ReplyMenu):
     admin_reply_menu.remove_messages,
 )
 async def child_button_handler(
-    message: types.Message, state: FSMContext, bot_user: BotUser, child: ReplyMenu
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    child: ReplyMenuNode,
+    analytics_service: AnalyticsService,
 ):
-    await child.fetch_related("children", "parent", "inline_menu")
+    analytics_service.track(ClickNodeType.reply_menu, child.id, bot_user.id)
 
     if child.children:
         dialog_messages = await send_user_reply_menu(bot_user, child)
-        return await state.update_data(dialog_messages=dialog_messages, menu=child)
+        return await state.update_data(
+            dialog_messages=dialog_messages, menu_id=child.id
+        )
 
     if child.parent:
         dialog_messages = await admin_reply_menu.send_reply_menu(
             bot_user,
             child.parent,
             child.inline_menu,
-            reply_markup=await markups.create_user_reply_menu_markup(child.parent),
-            inline_markup=await markups.create_user_inline_menu_markup(
-                child.inline_menu
-            ),
+            reply_markup=markups.create_user_reply_menu_markup(child.parent),
+            inline_markup=markups.create_user_inline_menu_markup(child.inline_menu),
             text=child.inline_menu.text,
         )
 
@@ -58,13 +63,19 @@ async def child_button_handler(
     admin_reply_menu.remove_messages,
 )
 async def back_button_handler(
-    message: types.Message, state: FSMContext, bot_user: BotUser
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
+    analytics_service: AnalyticsService,
 ):
     state_data = await state.get_data()
-    menu: ReplyMenu = state_data["menu"]
+    menu = menu_tree_service.get_reply_menu(state_data["menu_id"])
 
-    if menu.parent is None:
+    if menu is None or menu.parent is None:
         return
 
+    analytics_service.track(ClickNodeType.back, menu.id, bot_user.id)
+
     dialog_messages = await send_user_reply_menu(bot_user, menu.parent)
-    await state.update_data(dialog_messages=dialog_messages, menu=menu.parent)
+    await state.update_data(dialog_messages=dialog_messages, menu_id=menu.parent.id)
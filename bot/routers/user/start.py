@@ -2,14 +2,26 @@ from aiogram import types
 from aiogram.filters.command import CommandStart
 from aiogram.fsm.context import FSMContext
 
-from ...services.database.models import BotUser, ReplyMenu
+from ...services.analytics import AnalyticsService
+from ...services.database.models import BotUser
+from ...services.menu_tree import MenuTreeService
 from ...state import UserMenuState
+from ...utils.enums import ClickNodeType
+from ..admin import reply_menu as admin_reply_menu
 from . import reply_menu, router
 
 
 @router.message(CommandStart())
-async def start_handler(message: types.Message, state: FSMContext, bot_user: BotUser):
-    root_menu = await ReplyMenu.get_root_menu()
+async def start_handler(
+    message: types.Message,
+    state: FSMContext,
+    bot_user: BotUser,
+    menu_tree_service: MenuTreeService,
+    analytics_service: AnalyticsService,
+):
+    analytics_service.track(ClickNodeType.start, 0, bot_user.id)
+    root_menu = menu_tree_service.root_menu
+    admin_reply_menu.forget_reply_markup(bot_user.id)
     dialog_messages = await reply_menu.send_user_reply_menu(bot_user, root_menu)
     await state.set_state(UserMenuState.waiting_action)
-    await state.update_data(menu=root_menu, dialog_messages=dialog_messages)
+    await state.update_data(menu_id=root_menu.id, dialog_messages=dialog_messages)
@@ -1,14 +1,50 @@
+from ..bot import bot
 from ..utils.dispatcher import Dispatcher
+from ..utils.paths import root_path
+from .analytics import AnalyticsService
+from .blob_store import BlobStoreService
+from .blob_store.local import LocalBlobStore
+from .bot_user import BotUserService
+from .config_reload import ConfigReloadService
 from .database import DatabaseService
+from .mailing import MailingService
+from .menu_tree import MenuTreeService
+from .outbox import OutboxService
 from .schedule import ScheduleService, jobs
 
 
 async def setup(dispatcher: Dispatcher):
     schedule_service = ScheduleService()
     database_service = DatabaseService()
+    bot_user_service = BotUserService()
+    menu_tree_service = MenuTreeService()
+    blob_store_service = BlobStoreService(
+        LocalBlobStore(root_path / bot.config.blob_store_path)
+    )
+    outbox_service = OutboxService()
+    analytics_service = AnalyticsService()
+    config_reload_service = ConfigReloadService()
+    mailing_service = MailingService(
+        workers_count=bot.config.mailing_workers_count, rate=bot.config.mailing_rate
+    )
+
+    schedule_service.every(10).minutes.do(
+        jobs.evict_idle_fsm_records, dispatcher.fsm.storage
+    )
+    schedule_service.every(1).minutes.do(
+        jobs.flush_user_activities, bot_user_service
+    )
+    schedule_service.every(1).minutes.do(jobs.flush_click_rollups, analytics_service)
 
     dispatcher.services.register(database_service)
+    dispatcher.services.register(bot_user_service)
     dispatcher.services.register(schedule_service)
+    dispatcher.services.register(menu_tree_service)
+    dispatcher.services.register(blob_store_service)
+    dispatcher.services.register(outbox_service)
+    dispatcher.services.register(mailing_service)
+    dispatcher.services.register(analytics_service)
+    dispatcher.services.register(config_reload_service)
 
     await dispatcher.services.setup_all()
 
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from tortoise.transactions import in_transaction
+
+from ...utils.enums import ClickNodeType
+from ...utils.hyperloglog import HyperLogLog
+from ..database.models import ClickRollup
+from .rollup import ClickCounter
+
+RollupKey = Tuple[datetime, ClickNodeType, int]  # (hour, node type, node id)
+
+
+def to_utc(value: datetime):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+
+    return value.astimezone(timezone.utc)
+
+
+class AnalyticsService:
+    def __init__(self):
+        self._deltas: Dict[RollupKey, ClickCounter] = {}
+        # the scheduled job and get_stats both flush, and updates are read-modify-write
+        self._flush_lock = asyncio.Lock()
+
+    async def setup(self):
+        pass
+
+    async def dispose(self):
+        await self.flush()
+
+    def track(self, node_type: ClickNodeType, node_id: int, user_id: int):
+        hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+        for key in ((hour, node_type, node_id), (hour, ClickNodeType.any, 0)):
+            if (delta := self._deltas.get(key)) is None:
+                delta = self._deltas[key] = ClickCounter()
+
+            delta.clicks_count += 1
+            delta.users.add(user_id)
+
+    async def flush(self):
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._deltas:
+            return
+
+        deltas, self._deltas = self._deltas, {}
+        hours = [hour for hour, _, _ in deltas]
+
+        try:
+            # a range, as datetimes inlined into an IN list do not match the
+            # format SQLite stores them in
+            existing_rollups = {
+                (to_utc(rollup.hour), rollup.node_type, rollup.node_id): rollup
+                for rollup in await ClickRollup.filter(
+                    hour__gte=min(hours), hour__lte=max(hours)
+                )
+            }
+
+            async with in_transaction() as connection:
+                new_rollups: List[ClickRollup] = []
+
+                for (hour, node_type, node_id), delta in deltas.items():
+                    rollup = existing_rollups.get((hour, node_type, node_id))
+
+                    if rollup is None:
+                        new_rollups.append(
+                            ClickRollup(
+                                hour=hour,
+                                node_type=node_type,
+                                node_id=node_id,
+                                clicks_count=delta.clicks_count,
+                                users=bytes(delta.users.registers),
+                            )
+                        )
+                        continue
+
+                    users = HyperLogLog(rollup.users)
+                    users.merge(delta.users)
+                    rollup.clicks_count += delta.clicks_count
+                    rollup.users = bytes(users.registers)
+                    await rollup.save(
+                        update_fields=["clicks_count", "users"], using_db=connection
+                    )
+
+                await ClickRollup.bulk_create(new_rollups, using_db=connection)
+        except Exception:
+            logging.exception("Could not write click rollups")
+
+            # merged with whatever was tracked during the failed write
+            for key, delta in deltas.items():
+                if (newer_delta := self._deltas.get(key)) is None:
+                    self._deltas[key] = delta
+                    continue
+
+                newer_delta.clicks_count += delta.clicks_count
+                newer_delta.users.merge(delta.users)
+
+    async def get_stats(self, since: datetime):
+        await self.flush()
+
+        # reads only the rollup rows of the period, never the raw clicks
+        stats: Dict[Tuple[ClickNodeType, int], ClickCounter] = defaultdict(ClickCounter)
+
+        # the partly covered first hour is counted whole, rollups are hourly
+        since_hour = to_utc(since).replace(minute=0, second=0, microsecond=0)
+
+        for rollup in await ClickRollup.filter(hour__gte=since_hour):
+            node_stats = stats[(rollup.node_type, rollup.node_id)]
+            node_stats.clicks_count += rollup.clicks_count
+            node_stats.users.merge(HyperLogLog(rollup.users))
+
+        return stats
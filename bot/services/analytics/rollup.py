@@ -0,0 +1,9 @@
+from dataclasses import dataclass, field
+
+from ...utils.hyperloglog import HyperLogLog
+
+
+@dataclass(slots=True)
+class ClickCounter:
+    clicks_count: int = 0
+    users: HyperLogLog = field(default_factory=HyperLogLog)
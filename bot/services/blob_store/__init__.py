@@ -0,0 +1,62 @@
+from typing import AsyncIterable
+
+from tortoise import Tortoise
+
+from ...protocols.blob_store import BlobStore
+from ..database.models import MessageFile
+
+
+class BlobStoreService:
+    def __init__(self, backend: BlobStore):
+        self.backend = backend
+
+    async def setup(self):
+        await self.collect_garbage()
+
+    async def dispose(self):
+        pass
+
+    async def put_stream(self, chunks: AsyncIterable[bytes]):
+        return await self.backend.put_stream(chunks)
+
+    async def put_bytes(self, data: bytes):
+        async def chunks():
+            yield data
+
+        return await self.backend.put_stream(chunks())
+
+    def input_file(self, content_hash: str, filename: str):
+        return self.backend.input_file(content_hash, filename)
+
+    async def release(self, content_hash: str):
+        if not await MessageFile.filter(content_hash=content_hash).exists():
+            await self.backend.delete(content_hash)
+
+    async def collect_garbage(self):
+        # menus removed by cascade deletes leave their blobs behind
+        referenced_hashes = set(
+            await MessageFile.filter(content_hash__isnull=False).values_list(
+                "content_hash", flat=True
+            )
+        )
+
+        for content_hash in list(self.backend.hashes()):
+            if content_hash not in referenced_hashes:
+                await self.backend.delete(content_hash)
+
+    async def move_database_blobs(self):
+        message_file_ids = await MessageFile.filter(bytes__isnull=False).values_list(
+            "id", flat=True
+        )
+
+        for message_file_id in message_file_ids:
+            message_file = await MessageFile.get(id=message_file_id)
+            content_hash, size = await self.put_bytes(message_file.bytes)
+            await MessageFile.filter(id=message_file_id).update(
+                content_hash=content_hash, size=size, bytes=None
+            )
+
+        if message_file_ids:
+            await Tortoise.get_connection("default").execute_script("VACUUM")
+
+        return len(message_file_ids)
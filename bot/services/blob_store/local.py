@@ -0,0 +1,51 @@
+import hashlib
+from pathlib import Path
+from typing import AsyncIterable, Tuple
+from uuid import uuid4
+
+import aiofiles
+from aiogram import types
+
+
+class LocalBlobStore:
+    def __init__(self, path: Path):
+        self.path = path
+
+    def blob_path(self, content_hash: str):
+        return self.path / content_hash[:2] / content_hash
+
+    async def put_stream(self, chunks: AsyncIterable[bytes]) -> Tuple[str, int]:
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        temp_path = self.path / f".{uuid4().hex}.tmp"
+
+        try:
+            async with aiofiles.open(temp_path, "wb") as f:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await f.write(chunk)
+
+            content_hash = digest.hexdigest()
+            blob_path = self.blob_path(content_hash)
+
+            # identical content is stored once and shared between menus
+            if not blob_path.exists():
+                blob_path.parent.mkdir(exist_ok=True)
+                temp_path.replace(blob_path)
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+        return content_hash, size
+
+    async def delete(self, content_hash: str):
+        self.blob_path(content_hash).unlink(missing_ok=True)
+
+    def hashes(self):
+        for blob_path in self.path.glob("??/*"):
+            yield blob_path.name
+
+    def input_file(self, content_hash: str, filename: str):
+        return types.FSInputFile(self.blob_path(content_hash), filename=filename)
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiogram import types
+from tortoise import Tortoise
+
+from ...utils.lru_cache import LRUCache
+from ..database.models import BotUser
+from .activity import UserActivity
+
+ACTIVITY_CHUNK_SIZE = 1000
+
+# timestamps only move when something has changed, so incremental exports
+# do not pick up every user that merely wrote to the bot
+UPSERT_BOT_USERS_SQL = """
+INSERT INTO botuser (id, username, full_name, is_blocked, created_at, updated_at)
+VALUES (?, ?, ?, 0, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    username = excluded.username,
+    full_name = excluded.full_name,
+    is_blocked = 0,
+    updated_at = excluded.updated_at
+WHERE botuser.username IS NOT excluded.username
+    OR botuser.full_name IS NOT excluded.full_name
+    OR botuser.is_blocked
+"""
+
+
+def create_update_activity_sql(rows_count: int):
+    values = ", ".join(["(?, ?, ?, ?)"] * rows_count)
+    return f"""
+UPDATE botuser SET
+    last_seen_at = activity.column2,
+    messages_count = messages_count + activity.column3,
+    callback_queries_count = callback_queries_count + activity.column4
+FROM (VALUES {values}) AS activity
+WHERE botuser.id = activity.column1
+"""
+
+
+class BotUserService:
+    def __init__(
+        self,
+        *,
+        cache_size: int = 100_000,
+        flush_interval: float = 0.5,
+        flush_size: int = 500,
+    ):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._bot_users: LRUCache[int, BotUser] = LRUCache(maxsize=cache_size)
+        self._dirty_bot_users: Dict[int, BotUser] = {}
+        self._flush_event = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._activities: Dict[int, UserActivity] = {}
+        self._activities_lock = asyncio.Lock()
+
+    async def setup(self):
+        self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def dispose(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+
+            with suppress(asyncio.CancelledError):
+                await self._flush_task
+
+            self._flush_task = None
+
+        await self.flush()
+        await self.flush_activities()
+
+    def get(self, user: types.User):
+        bot_user = self._bot_users.get(user.id)
+
+        if (
+            bot_user is not None
+            and bot_user.username == user.username
+            and bot_user.full_name == user.full_name
+        ):
+            return bot_user
+
+        # unknown users are upserted, so the hot path never waits for a SELECT
+        if bot_user is None:
+            bot_user = BotUser(
+                id=user.id, username=user.username, full_name=user.full_name
+            )
+            self._bot_users.set(user.id, bot_user)
+        else:
+            bot_user.username = user.username
+            bot_user.full_name = user.full_name
+
+        self._dirty_bot_users[user.id] = bot_user
+
+        if len(self._dirty_bot_users) >= self.flush_size:
+            self._flush_event.set()
+
+        return bot_user
+
+    def track(self, event: types.TelegramObject, user_id: int):
+        # only aggregated here, the schedule service writes it in bulk
+        if (activity := self._activities.get(user_id)) is None:
+            activity = self._activities[user_id] = UserActivity(
+                last_seen_at=datetime.now(timezone.utc)
+            )
+        else:
+            activity.last_seen_at = datetime.now(timezone.utc)
+
+        if isinstance(event, types.CallbackQuery):
+            activity.callback_queries_count += 1
+        else:
+            activity.messages_count += 1
+
+    def forget(self, user_ids: Iterable[int]):
+        # the next update from these users writes them again
+        for user_id in user_ids:
+            self._bot_users.pop(user_id)
+
+    async def flush(self):
+        if not self._dirty_bot_users:
+            return
+
+        dirty_bot_users, self._dirty_bot_users = self._dirty_bot_users, {}
+        now = str(datetime.now(timezone.utc))
+
+        try:
+            await Tortoise.get_connection("default").execute_many(
+                UPSERT_BOT_USERS_SQL,
+                [
+                    [bot_user.id, bot_user.username, bot_user.full_name, now, now]
+                    for bot_user in dirty_bot_users.values()
+                ],
+            )
+        except Exception:
+            logging.exception("Could not write bot users")
+            # keeps newer changes that were made during the failed write
+            dirty_bot_users.update(self._dirty_bot_users)
+            self._dirty_bot_users = dirty_bot_users
+        except asyncio.CancelledError:
+            dirty_bot_users.update(self._dirty_bot_users)
+            self._dirty_bot_users = dirty_bot_users
+            raise
+
+    async def flush_activities(self):
+        # a slow flush makes the next one skip instead of piling up
+        if self._activities_lock.locked() or not self._activities:
+            return
+
+        async with self._activities_lock:
+            # users from the write-behind buffer have to exist to be updated
+            await self.flush()
+
+            activities = list(self._activities.items())
+            self._activities = {}
+            connection = Tortoise.get_connection("default")
+
+            for i in range(0, len(activities), ACTIVITY_CHUNK_SIZE):
+                chunk = activities[i : i + ACTIVITY_CHUNK_SIZE]
+
+                try:
+                    await connection.execute_query(
+                        create_update_activity_sql(len(chunk)),
+                        [
+                            value
+                            for user_id, activity in chunk
+                            for value in (
+                                user_id,
+                                str(activity.last_seen_at),
+                                activity.messages_count,
+                                activity.callback_queries_count,
+                            )
+                        ],
+                    )
+                except Exception:
+                    logging.exception("Could not write user activity")
+                    self._restore_activities(chunk)
+
+    def _restore_activities(self, activities: List[Tuple[int, UserActivity]]):
+        # merged with whatever was tracked during the failed write
+        for user_id, activity in activities:
+            if (newer_activity := self._activities.get(user_id)) is None:
+                self._activities[user_id] = activity
+                continue
+
+            newer_activity.messages_count += activity.messages_count
+            newer_activity.callback_queries_count += activity.callback_queries_count
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._flush_event.clear()
+            await self.flush()
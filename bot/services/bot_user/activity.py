@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass(slots=True)
+class UserActivity:
+    last_seen_at: datetime
+    messages_count: int = 0
+    callback_queries_count: int = 0
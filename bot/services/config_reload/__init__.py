@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, Type
+
+from ... import markups
+from ...bot import bot, dispatcher
+from ...models.config.bot_config import BotConfig
+from ...models.config_model import ConfigModel
+from ...models.phrases.bot_phrases import BotPhrases
+
+FileStamp = Tuple[int, int]  # (mtime ns, size)
+
+# read once at startup, changing them still needs a restart
+RESTART_REQUIRED_FIELDS = (
+    "bot_token",
+    "database_uri",
+    "blob_store_path",
+    "fsm_storage_path",
+    "mailing_workers_count",
+    "mailing_rate",
+    "journal_enabled",
+    "journal_path",
+    "api_rate",
+    "private_chat_rate",
+    "group_chat_rate_per_minute",
+)
+
+
+def get_file_stamp(path: Optional[Path]) -> Optional[FileStamp]:
+    if path is None:
+        return None
+
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def apply_config(config: BotConfig):
+    for field_name in RESTART_REQUIRED_FIELDS:
+        if getattr(config, field_name) != getattr(bot.config, field_name):
+            logging.warning("Config field %r is applied only after restart", field_name)
+
+    bot.set_config(config)
+
+
+def apply_phrases(phrases: BotPhrases):
+    bot.set_phrases(phrases)
+    # cached markups contain texts of the old phrases
+    markups.user_markups_cache.clear()
+
+
+class ConfigReloadService:
+    def __init__(self, *, interval: float = 2):
+        self.interval = interval
+        self._appliers: Dict[Type[ConfigModel], Callable] = {
+            BotConfig: apply_config,
+            BotPhrases: apply_phrases,
+        }
+        self._stamps: Dict[Type[ConfigModel], Optional[FileStamp]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _get_path(model_type: Type[ConfigModel]):
+        return next(model_type.__exist_filepaths__(), None)
+
+    async def setup(self):
+        for model_type in self._appliers:
+            self._stamps[model_type] = get_file_stamp(self._get_path(model_type))
+
+        self._task = asyncio.create_task(self._watch())
+
+    async def dispose(self):
+        if self._task is not None:
+            self._task.cancel()
+
+        self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                await self.reload()
+            except Exception:
+                logging.exception("Could not reload config files")
+
+    async def reload(self, *, force: bool = False):
+        for model_type, apply in self._appliers.items():
+            path = self._get_path(model_type)
+            stamp = get_file_stamp(path)
+
+            if path is None or (stamp == self._stamps.get(model_type) and not force):
+                continue
+
+            # remembered before parsing, a broken file is reported once per change
+            self._stamps[model_type] = stamp
+
+            try:
+                # parsed off the event loop, updates keep being handled meanwhile
+                model_object = await asyncio.to_thread(model_type.load_from_path, path)
+            except Exception:
+                logging.exception("Could not parse %s, keeping the old one", path)
+                continue
+
+            apply(model_object)
+            dispatcher.journal.record("config_reloaded", file=path.name)
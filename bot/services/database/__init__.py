@@ -1,6 +1,7 @@
 from tortoise import Tortoise
 
 from ...bot import bot
+from .migrations import add_missing_columns, drop_not_null_constraints
 
 
 class DatabaseService:
@@ -11,6 +12,8 @@ class DatabaseService:
         )
 
         await Tortoise.generate_schemas()
+        await add_missing_columns()
+        await drop_not_null_constraints()
 
     async def dispose(self):
         await Tortoise.close_connections()
@@ -0,0 +1,64 @@
+import re
+
+from tortoise import Tortoise
+
+# generate_schemas only creates missing tables, so columns added to existing
+# models are appended here: (table, column, definition)
+ADDED_COLUMNS = (
+    ("messagefile", "telegram_file_id", "TEXT"),
+    ("messagefile", "content_hash", "VARCHAR(64)"),
+    ("messagefile", "size", "BIGINT"),
+    ("botuser", "is_blocked", "INT NOT NULL DEFAULT 0"),
+    ("mailingjob", "progress_message_id", "INT"),
+    ("botuser", "created_at", "TIMESTAMP"),
+    ("botuser", "updated_at", "TIMESTAMP"),
+    ("botuser", "last_seen_at", "TIMESTAMP"),
+    ("botuser", "messages_count", "INT NOT NULL DEFAULT 0"),
+    ("botuser", "callback_queries_count", "INT NOT NULL DEFAULT 0"),
+)
+
+# columns that became nullable: (table, column)
+NULLABLE_COLUMNS = (("messagefile", "bytes"),)
+
+
+async def add_missing_columns():
+    connection = Tortoise.get_connection("default")
+
+    for table, column, definition in ADDED_COLUMNS:
+        columns = await connection.execute_query_dict(f'PRAGMA table_info("{table}")')
+
+        if any(c["name"] == column for c in columns):
+            continue
+
+        await connection.execute_script(
+            f'ALTER TABLE "{table}" ADD COLUMN "{column}" {definition}'
+        )
+
+
+async def drop_not_null_constraints():
+    connection = Tortoise.get_connection("default")
+
+    for table, column in NULLABLE_COLUMNS:
+        columns = await connection.execute_query_dict(f'PRAGMA table_info("{table}")')
+
+        if not any(c["name"] == column and c["notnull"] for c in columns):
+            continue
+
+        # sqlite can not alter a column constraint, the table has to be rebuilt
+        rows = await connection.execute_query_dict(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", [table]
+        )
+        create_table_sql = re.sub(
+            rf'("{column}" \w+) NOT NULL', r"\1", rows[0]["sql"], count=1
+        ).replace(f'"{table}"', f'"{table}_new"', 1)
+
+        await connection.execute_script(
+            "PRAGMA foreign_keys = OFF;"
+            "BEGIN;"
+            f"{create_table_sql};"
+            f'INSERT INTO "{table}_new" SELECT * FROM "{table}";'
+            f'DROP TABLE "{table}";'
+            f'ALTER TABLE "{table}_new" RENAME TO "{table}";'
+            "COMMIT;"
+            "PRAGMA foreign_keys = ON;"
+        )
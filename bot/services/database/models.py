@@ -1,14 +1,28 @@
+from typing import Optional
+
 from tortoise import fields
 from tortoise.models import Model
 
 from ...bot import bot
-from ...utils.enums import Alignment
+from ...utils.enums import (
+    Alignment,
+    ClickNodeType,
+    DeliveryStatus,
+    MailingStatus,
+)
 
 
 class BotUser(Model):
     id = fields.IntField(pk=True, unique=True)  # telegram user id
     username = fields.TextField(null=True)
     full_name = fields.TextField()
+    is_blocked = fields.BooleanField(default=False)
+    # null for users that were created before the columns existed
+    created_at = fields.DatetimeField(null=True, auto_now_add=True)
+    updated_at = fields.DatetimeField(null=True, auto_now=True)
+    last_seen_at = fields.DatetimeField(null=True)
+    messages_count = fields.IntField(default=0)
+    callback_queries_count = fields.IntField(default=0)
 
 
 class ReplyMenu(Model):
@@ -68,7 +82,78 @@ class InlineMenu(Model):
 class MessageFile(Model):
     id = fields.IntField(pk=True, unique=True)
     filename = fields.TextField()
-    bytes = fields.BinaryField()
+    bytes = fields.BinaryField(null=True)  # legacy, content lives in the blob store
+    content_hash = fields.CharField(64, null=True)
+    size = fields.BigIntField(null=True)
+    telegram_file_id = fields.TextField(null=True)
     inline_menu: fields.OneToOneRelation["InlineMenu"] = fields.OneToOneField(
         "models.InlineMenu", related_name="file"
     )
+
+    @classmethod
+    def only_metadata(cls):
+        # everything except the legacy bytes column
+        return cls.all().only(
+            "id",
+            "filename",
+            "content_hash",
+            "size",
+            "telegram_file_id",
+            "inline_menu_id",
+        )
+
+    async def read_bytes(self) -> Optional[bytes]:
+        return (
+            await MessageFile.filter(id=self.id)
+            .first()
+            .values_list("bytes", flat=True)  # type: ignore
+        )
+
+
+class MailingJob(Model):
+    id = fields.IntField(pk=True, unique=True)
+    admin_id = fields.BigIntField()
+    from_chat_id = fields.BigIntField()
+    message_id = fields.IntField()
+    status = fields.IntEnumField(MailingStatus, default=MailingStatus.running)
+    last_user_id = fields.BigIntField(default=0)  # users are claimed in id order
+    total_count = fields.IntField(default=0)
+    sent_count = fields.IntField(default=0)
+    blocked_count = fields.IntField(default=0)
+    not_found_count = fields.IntField(default=0)
+    failed_count = fields.IntField(default=0)
+    progress_message_id = fields.IntField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    finished_at = fields.DatetimeField(null=True)
+
+
+class MailingDelivery(Model):
+    id = fields.IntField(pk=True, unique=True)
+    job: fields.ForeignKeyRelation[MailingJob] = fields.ForeignKeyField(
+        "models.MailingJob", related_name="deliveries"
+    )
+    user_id = fields.BigIntField()
+    status = fields.IntEnumField(DeliveryStatus, default=DeliveryStatus.pending)
+
+    class Meta:
+        unique_together = (("job", "user_id"),)
+
+
+class UserExport(Model):
+    id = fields.IntField(pk=True, unique=True)
+    export_format = fields.CharField(16)
+    is_incremental = fields.BooleanField()
+    rows_count = fields.IntField()
+    started_at = fields.DatetimeField()  # users changed after it go to the next one
+
+
+class ClickRollup(Model):
+    id = fields.IntField(pk=True, unique=True)
+    hour = fields.DatetimeField(index=True)
+    node_type = fields.IntEnumField(ClickNodeType)
+    node_id = fields.IntField()
+    clicks_count = fields.IntField(default=0)
+    users = fields.BinaryField()  # HyperLogLog registers of the clicking users
+
+    class Meta:
+        unique_together = (("hour", "node_type", "node_id"),)
@@ -0,0 +1,36 @@
+from typing import Any, AsyncIterator, List, TypeVar
+
+from tortoise.models import Model
+from tortoise.queryset import QuerySet
+
+MODEL = TypeVar("MODEL", bound=Model)
+
+
+async def iter_chunks(
+    queryset: QuerySet[MODEL],
+    *fields: str,
+    chunk_size: int = 1000,
+    after_id: int = 0,
+) -> AsyncIterator[List[Any]]:
+    # yields models, or tuples of the given fields when there are any
+    if fields and fields[0] != "id":
+        raise ValueError("The first field has to be the id")
+
+    while True:
+        # keyset pagination: a chunk costs the same no matter how far it is
+        chunk_queryset = (
+            queryset.filter(id__gt=after_id).order_by("id").limit(chunk_size)
+        )
+        chunk = await (
+            chunk_queryset.values_list(*fields) if fields else chunk_queryset
+        )
+
+        if not chunk:
+            return
+
+        yield chunk
+
+        if len(chunk) < chunk_size:
+            return
+
+        after_id = chunk[-1][0] if fields else chunk[-1].id
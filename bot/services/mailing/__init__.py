@@ -0,0 +1,451 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import exceptions
+from aiogram.methods import CopyMessage
+from tortoise.transactions import in_transaction
+
+from ... import markups
+from ...bot import bot, dispatcher
+from ...utils.enums import DeliveryStatus, Lane, MailingStatus
+from ...utils.lanes import use_lane
+from ...utils.token_bucket import TokenBucket
+from ..bot_user import BotUserService
+from ..database.models import BotUser, MailingDelivery, MailingJob
+from ..database.pagination import iter_chunks
+from .mailing import Mailing
+
+CLAIM_SIZE = 100
+ACTIVE_STATUSES = (MailingStatus.running, MailingStatus.paused)
+
+
+def format_mailing_status(status: MailingStatus) -> str:
+    return getattr(bot.phrases.admin, f"mailing_{status.name}")
+
+
+class MailingService:
+    def __init__(
+        self,
+        *,
+        workers_count: int = 8,
+        rate: float = 25,
+        flush_interval: float = 1,
+        progress_interval: float = 5,
+        dispose_timeout: float = 10,
+    ):
+        self.workers_count = workers_count
+        self.flush_interval = flush_interval
+        self.progress_interval = progress_interval
+        self.dispose_timeout = dispose_timeout
+        self.rate_limiter = TokenBucket(rate)
+        self.mailings: Dict[int, Mailing] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # mailing id -> delivery results that are not written yet
+        self._deliveries: Dict[int, List[Tuple[int, DeliveryStatus]]] = defaultdict(
+            list
+        )
+        self._flush_task: Optional[asyncio.Task] = None
+        self._progress_task: Optional[asyncio.Task] = None
+
+    async def setup(self):
+        for job in await MailingJob.filter(status__in=ACTIVE_STATUSES):
+            # deliveries still pending were in flight when the bot stopped, they may
+            # have been sent already, so they are not retried
+            lost_count = await MailingDelivery.filter(
+                job_id=job.id, status=DeliveryStatus.pending
+            ).update(status=DeliveryStatus.failed)
+            job.failed_count += lost_count
+            await job.save(update_fields=["failed_count"])
+            self._start(Mailing.from_job(job))
+
+        self._flush_task = asyncio.create_task(self._flush_periodically())
+
+        with use_lane(Lane.admin):
+            self._progress_task = asyncio.create_task(
+                self._update_progress_periodically()
+            )
+
+    async def dispose(self):
+        for mailing in self.mailings.values():
+            mailing.stop()
+
+        # in-flight copies are let through, so their results are written below
+        if tasks := list(self._tasks.values()):
+            _, pending = await asyncio.wait(tasks, timeout=self.dispose_timeout)
+
+            for task in pending:
+                task.cancel()
+
+            if pending:
+                logging.warning("Mailings did not stop in time, cancelling them")
+                await asyncio.wait(pending)
+
+        for mailing in self.mailings.values():
+            try:
+                await self._release_unsent(mailing)
+            except Exception:
+                logging.exception("Could not release mailing %s claims", mailing.id)
+
+        for task in (self._flush_task, self._progress_task):
+            if task is None:
+                continue
+
+            task.cancel()
+
+            with suppress(asyncio.CancelledError):
+                await task
+
+        self._flush_task = None
+        self._progress_task = None
+        await self.flush()
+
+    async def start(self, admin_id: int, from_chat_id: int, message_id: int):
+        job = await MailingJob.create(
+            admin_id=admin_id,
+            from_chat_id=from_chat_id,
+            message_id=message_id,
+            total_count=await BotUser.filter(is_blocked=False).count(),
+        )
+        mailing = Mailing.from_job(job)
+        await self.update_progress(mailing)
+        self._start(mailing)
+        return mailing
+
+    def _start(self, mailing: Mailing):
+        self.mailings[mailing.id] = mailing
+
+        # progress and reports go to the admin, the copies themselves are bulk
+        with use_lane(Lane.admin):
+            self._tasks[mailing.id] = asyncio.create_task(self._run(mailing))
+
+    async def pause(self, mailing_id: int):
+        mailing = self.mailings.get(mailing_id)
+
+        if mailing is None or mailing.status != MailingStatus.running:
+            return None
+
+        mailing.pause()
+        await MailingJob.filter(id=mailing_id).update(status=MailingStatus.paused)
+        await self.update_progress(mailing)
+        return mailing
+
+    async def resume(self, mailing_id: int):
+        mailing = self.mailings.get(mailing_id)
+
+        if mailing is None or mailing.status != MailingStatus.paused:
+            return None
+
+        mailing.resume()
+        await MailingJob.filter(id=mailing_id).update(status=MailingStatus.running)
+        await self.update_progress(mailing)
+        return mailing
+
+    async def cancel(self, mailing_id: int):
+        mailing = self.mailings.get(mailing_id)
+
+        if mailing is None:
+            return None
+
+        if (task := self._tasks.get(mailing_id)) is not None:
+            task.cancel()
+
+            with suppress(asyncio.CancelledError):
+                await task
+
+        await self.flush()
+        await self._finish(mailing, MailingStatus.cancelled)
+        return mailing
+
+    async def _finish(self, mailing: Mailing, status: MailingStatus):
+        mailing.status = status
+        mailing.finished_at = time.monotonic()
+        self.mailings.pop(mailing.id, None)
+
+        await MailingJob.filter(id=mailing.id).update(
+            status=status,
+            finished_at=datetime.now(timezone.utc),
+            sent_count=mailing.sent_count,
+            blocked_count=mailing.blocked_count,
+            not_found_count=mailing.not_found_count,
+            failed_count=mailing.failed_count,
+        )
+        await self.update_progress(mailing)
+
+    def format_progress(self, mailing: Mailing):
+        eta = mailing.eta
+
+        return bot.phrases.admin.mailing_progress_message_text_fmt.format(
+            id=mailing.id,
+            status=format_mailing_status(mailing.status),
+            sent_count=mailing.sent_count,
+            total_count=mailing.total_count,
+            blocked_count=mailing.blocked_count,
+            failed_count=mailing.not_found_count + mailing.failed_count,
+            throughput=mailing.throughput,
+            eta="—" if eta is None else timedelta(seconds=round(eta)),
+        )
+
+    async def update_progress(self, mailing: Mailing):
+        text = self.format_progress(mailing)
+
+        # coalesced: unchanged progress is never sent again
+        if text == mailing.rendered_progress:
+            return
+
+        mailing.rendered_progress = text
+        reply_markup = markups.create_mailing_markup(mailing.id, mailing.status)
+        # progress shares the rate budget with the mailing itself
+        await self.rate_limiter.acquire()
+
+        try:
+            if mailing.progress_message_id is None:
+                message = await bot.send_message(
+                    mailing.admin_id, text, reply_markup=reply_markup
+                )
+                mailing.progress_message_id = message.message_id
+                await MailingJob.filter(id=mailing.id).update(
+                    progress_message_id=message.message_id
+                )
+            else:
+                await bot.edit_message_text(
+                    text,
+                    mailing.admin_id,
+                    mailing.progress_message_id,
+                    reply_markup=reply_markup,
+                )
+        except exceptions.TelegramBadRequest as e:
+            logging.debug("Could not update mailing %s progress: %s", mailing.id, e)
+
+    async def _update_progress_periodically(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+
+            for mailing in list(self.mailings.values()):
+                try:
+                    await self.update_progress(mailing)
+                except Exception:
+                    logging.exception(
+                        "Could not update mailing %s progress", mailing.id
+                    )
+
+    async def _run(self, mailing: Mailing):
+        user_ids: asyncio.Queue[Optional[int]] = asyncio.Queue(CLAIM_SIZE * 2)
+        workers = [
+            asyncio.create_task(self._send_all(mailing, user_ids))
+            for _ in range(self.workers_count)
+        ]
+
+        try:
+            await self._claim_all(mailing, user_ids)
+
+            for _ in workers:
+                await user_ids.put(None)
+
+            await asyncio.gather(*workers)
+
+            if mailing.stopping:
+                return
+
+            await self.flush()
+            await self._finish(mailing, MailingStatus.finished)
+            await bot.send_message(
+                mailing.admin_id,
+                bot.phrases.admin.sent_messages_message_text_fmt.format(
+                    sent_messages_count=mailing.sent_count,
+                    blocked_count=mailing.blocked_count,
+                    failed_count=mailing.not_found_count + mailing.failed_count,
+                    elapsed=mailing.elapsed,
+                    throughput=mailing.throughput,
+                ),
+            )
+        except Exception:
+            logging.exception("Mailing %s has failed", mailing.id)
+            await self._fail(mailing)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+            # unsent claims are only final once no worker can pick them up
+            await asyncio.gather(*workers, return_exceptions=True)
+            del self._tasks[mailing.id]
+
+    async def _fail(self, mailing: Mailing):
+        # nothing runs the mailing anymore, so it must not look alive
+        try:
+            await self.flush()
+            await self._finish(mailing, MailingStatus.failed)
+            await bot.send_message(
+                mailing.admin_id,
+                bot.phrases.admin.mailing_failed_message_text_fmt.format(
+                    id=mailing.id
+                ),
+            )
+        except Exception:
+            logging.exception("Could not finish failed mailing %s", mailing.id)
+            self.mailings.pop(mailing.id, None)
+
+    async def _release_unsent(self, mailing: Mailing):
+        if not (unsent_user_ids := mailing.unsent_user_ids):
+            return
+
+        # the checkpoint goes back, already delivered users are skipped on claim
+        last_user_id = min(unsent_user_ids) - 1
+
+        async with in_transaction() as connection:
+            await MailingDelivery.filter(
+                job_id=mailing.id,
+                user_id__in=list(unsent_user_ids),
+                status=DeliveryStatus.pending,
+            ).using_db(connection).delete()
+            await MailingJob.filter(id=mailing.id).using_db(connection).update(
+                last_user_id=last_user_id
+            )
+
+        mailing.last_user_id = last_user_id
+        unsent_user_ids.clear()
+
+    async def _claim_all(
+        self, mailing: Mailing, user_ids: "asyncio.Queue[Optional[int]]"
+    ):
+        async for rows in iter_chunks(
+            BotUser.filter(is_blocked=False),
+            "id",
+            chunk_size=CLAIM_SIZE,
+            after_id=mailing.last_user_id,
+        ):
+            if mailing.stopping:
+                return
+
+            chunk_user_ids: List[int] = [user_id for user_id, in rows]
+
+            # claimed users are never sent to again, even after a restart; users
+            # with a delivery already (after released claims) are left out
+            async with in_transaction() as connection:
+                await MailingDelivery.bulk_create(
+                    [
+                        MailingDelivery(job_id=mailing.id, user_id=user_id)
+                        for user_id in chunk_user_ids
+                    ],
+                    ignore_conflicts=True,
+                    using_db=connection,
+                )
+                claimed_user_ids = await MailingDelivery.filter(
+                    job_id=mailing.id,
+                    user_id__in=chunk_user_ids,
+                    status=DeliveryStatus.pending,
+                ).using_db(connection).values_list("user_id", flat=True)
+                await MailingJob.filter(id=mailing.id).using_db(connection).update(
+                    last_user_id=chunk_user_ids[-1]
+                )
+
+            mailing.last_user_id = chunk_user_ids[-1]
+            mailing.unsent_user_ids.update(claimed_user_ids)
+
+            for user_id in sorted(claimed_user_ids):
+                await user_ids.put(user_id)
+
+    async def _send_all(
+        self, mailing: Mailing, user_ids: "asyncio.Queue[Optional[int]]"
+    ):
+        # a stopping mailing keeps draining the queue, so the claimer is not stuck
+        while (user_id := await user_ids.get()) is not None:
+            if (status := await self._send(mailing, user_id)) is not None:
+                self._deliveries[mailing.id].append((user_id, status))
+
+    async def _send(self, mailing: Mailing, user_id: int) -> Optional[DeliveryStatus]:
+        call = CopyMessage(
+            chat_id=user_id,
+            from_chat_id=mailing.from_chat_id,
+            message_id=mailing.message_id,
+        )
+
+        while True:
+            await mailing.resumed.wait()
+            await self.rate_limiter.acquire()
+
+            # left unsent, the claim is released on dispose
+            if mailing.stopping:
+                return None
+
+            # from here on the message may reach the user
+            mailing.unsent_user_ids.discard(user_id)
+
+            try:
+                await bot(call, handle_retry_after=False, lane=Lane.bulk)
+            except exceptions.TelegramRetryAfter as e:
+                # the limit is global, so every worker has to wait
+                self.rate_limiter.pause(e.retry_after)
+                mailing.unsent_user_ids.add(user_id)
+                continue
+            except exceptions.TelegramForbiddenError:
+                mailing.blocked_count += 1
+                return DeliveryStatus.blocked
+            except exceptions.TelegramBadRequest as e:
+                if "chat not found" in e.message:
+                    mailing.not_found_count += 1
+                    return DeliveryStatus.not_found
+
+                mailing.failed_count += 1
+                logging.debug("Could not send mailing to %s: %s", user_id, e)
+                return DeliveryStatus.failed
+            except Exception as e:
+                mailing.failed_count += 1
+                logging.debug("Could not send mailing to %s: %s", user_id, e)
+                return DeliveryStatus.failed
+
+            mailing.sent_count += 1
+            return DeliveryStatus.sent
+
+    async def flush(self):
+        deliveries, self._deliveries = self._deliveries, defaultdict(list)
+
+        for mailing_id, mailing_deliveries in deliveries.items():
+            user_ids_by_status: Dict[DeliveryStatus, List[int]] = defaultdict(list)
+
+            for user_id, status in mailing_deliveries:
+                user_ids_by_status[status].append(user_id)
+
+            mailing = self.mailings.get(mailing_id)
+
+            try:
+                async with in_transaction() as connection:
+                    for status, user_ids in user_ids_by_status.items():
+                        await MailingDelivery.filter(
+                            job_id=mailing_id, user_id__in=user_ids
+                        ).using_db(connection).update(status=status)
+
+                    # finished mailings have written their counters already
+                    if mailing is not None:
+                        await MailingJob.filter(id=mailing_id).using_db(
+                            connection
+                        ).update(
+                            sent_count=mailing.sent_count,
+                            blocked_count=mailing.blocked_count,
+                            not_found_count=mailing.not_found_count,
+                            failed_count=mailing.failed_count,
+                        )
+
+                    if blocked_user_ids := user_ids_by_status.get(
+                        DeliveryStatus.blocked
+                    ):
+                        await BotUser.filter(id__in=blocked_user_ids).using_db(
+                            connection
+                        ).update(is_blocked=True)
+            except Exception:
+                logging.exception("Could not write mailing %s deliveries", mailing_id)
+                self._deliveries[mailing_id][:0] = mailing_deliveries
+            else:
+                # cached users would never clear the flag when they come back
+                dispatcher.services.get(BotUserService).forget(
+                    user_ids_by_status.get(DeliveryStatus.blocked, ())
+                )
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
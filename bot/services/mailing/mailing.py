@@ -0,0 +1,107 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Set
+
+from ...utils.enums import MailingStatus
+from ..database.models import MailingJob
+
+
+@dataclass(eq=False)
+class Mailing:
+    id: int
+    admin_id: int
+    from_chat_id: int
+    message_id: int
+    status: MailingStatus = MailingStatus.running
+    progress_message_id: Optional[int] = None
+    last_user_id: int = 0
+    total_count: int = 0
+    sent_count: int = 0
+    blocked_count: int = 0
+    not_found_count: int = 0
+    failed_count: int = 0
+    initial_processed_count: int = 0  # processed before a resume
+    started_at: float = field(default_factory=time.monotonic)
+    paused_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    rendered_progress: Optional[str] = field(default=None, repr=False)
+    # claimed, but not handed to the API yet, so they can be claimed again
+    unsent_user_ids: Set[int] = field(default_factory=set, repr=False)
+    resumed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    # no more users are claimed or sent to, the job stays active for a restart
+    stopping: bool = field(default=False, repr=False)
+
+    def __post_init__(self):
+        if self.status == MailingStatus.running:
+            self.resumed.set()
+        elif self.status == MailingStatus.paused and self.paused_at is None:
+            self.paused_at = self.started_at
+
+    @classmethod
+    def from_job(cls, job: MailingJob):
+        mailing = cls(
+            id=job.id,
+            admin_id=job.admin_id,
+            from_chat_id=job.from_chat_id,
+            message_id=job.message_id,
+            status=job.status,
+            progress_message_id=job.progress_message_id,
+            last_user_id=job.last_user_id,
+            total_count=job.total_count,
+            sent_count=job.sent_count,
+            blocked_count=job.blocked_count,
+            not_found_count=job.not_found_count,
+            failed_count=job.failed_count,
+        )
+        mailing.initial_processed_count = mailing.processed_count
+        return mailing
+
+    def pause(self):
+        self.status = MailingStatus.paused
+        self.paused_at = time.monotonic()
+        self.resumed.clear()
+
+    def resume(self):
+        # pauses do not count towards the throughput
+        if self.paused_at is not None:
+            self.started_at += time.monotonic() - self.paused_at
+            self.paused_at = None
+
+        self.status = MailingStatus.running
+        self.resumed.set()
+
+    def stop(self):
+        self.stopping = True
+        # paused workers have to wake up to see it
+        self.resumed.set()
+
+    @property
+    def processed_count(self):
+        return (
+            self.sent_count
+            + self.blocked_count
+            + self.not_found_count
+            + self.failed_count
+        )
+
+    @property
+    def elapsed(self):
+        end = self.finished_at or self.paused_at or time.monotonic()
+        return end - self.started_at
+
+    @property
+    def throughput(self):
+        elapsed = self.elapsed
+        processed_count = self.processed_count - self.initial_processed_count
+        return processed_count / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        if self.finished_at is not None:
+            return 0.0
+
+        if not (throughput := self.throughput):
+            return None
+
+        return (self.total_count - self.processed_count) / throughput
@@ -0,0 +1,111 @@
+from typing import Dict, Optional
+
+from ..database.models import InlineMenu, MessageFile, ReplyMenu
+from .nodes import InlineMenuNode, ReplyMenuNode
+
+INLINE_MENU_FIELDS = (
+    "name",
+    "text",
+    "url",
+    "back_button_text",
+    "alignment",
+    "position",
+)
+REPLY_MENU_FIELDS = ("name", "back_button_text", "alignment", "position")
+
+
+class MenuTreeService:
+    def __init__(self):
+        self._reply_menus: Dict[int, ReplyMenuNode] = {}
+        self._inline_menus: Dict[int, InlineMenuNode] = {}
+        self.version = 0
+
+    async def setup(self):
+        await self.refresh()
+
+    async def dispose(self):
+        self._reply_menus.clear()
+        self._inline_menus.clear()
+
+    @property
+    def root_menu(self) -> ReplyMenuNode:
+        return self._reply_menus[1]
+
+    def get_reply_menu(self, menu_id: int) -> Optional[ReplyMenuNode]:
+        return self._reply_menus.get(menu_id)
+
+    def get_inline_menu(self, menu_id: int) -> Optional[InlineMenuNode]:
+        return self._inline_menus.get(menu_id)
+
+    async def refresh(self):
+        # creates the root menu on an empty database
+        await ReplyMenu.get_root_menu()
+
+        reply_menus = await ReplyMenu.all().order_by("id")
+        inline_menus = await InlineMenu.all().order_by("id")
+        message_files = await MessageFile.only_metadata()
+
+        # every refresh bumps the version, so cached user markups get rebuilt
+        self.version += 1
+
+        # nodes are patched in place, so references held in FSM data stay fresh
+        inline_nodes: Dict[int, InlineMenuNode] = {}
+
+        for inline_menu in inline_menus:
+            node = self._inline_menus.get(inline_menu.id) or InlineMenuNode(
+                id=inline_menu.id
+            )
+
+            for field_name in INLINE_MENU_FIELDS:
+                setattr(node, field_name, getattr(inline_menu, field_name))
+
+            node.version = self.version
+            node.children = []
+            node.file = None
+            inline_nodes[node.id] = node
+
+        for inline_menu in inline_menus:
+            node = inline_nodes[inline_menu.id]
+            node.parent = inline_nodes.get(inline_menu.parent_id)  # type: ignore
+
+            if node.parent is not None:
+                node.parent.children.append(node)
+
+        for message_file in message_files:
+            node = inline_nodes.get(message_file.inline_menu_id)  # type: ignore
+
+            if node is not None:
+                node.file = message_file
+
+        reply_nodes: Dict[int, ReplyMenuNode] = {}
+
+        for reply_menu in reply_menus:
+            inline_node = inline_nodes[reply_menu.inline_menu_id]  # type: ignore
+            node = self._reply_menus.get(reply_menu.id)
+
+            if node is None:
+                node = ReplyMenuNode(id=reply_menu.id, inline_menu=inline_node)
+
+            for field_name in REPLY_MENU_FIELDS:
+                setattr(node, field_name, getattr(reply_menu, field_name))
+
+            node.version = self.version
+            node.inline_menu = inline_node
+            node.children = []
+            reply_nodes[node.id] = node
+
+        for reply_menu in reply_menus:
+            node = reply_nodes[reply_menu.id]
+            node.parent = reply_nodes.get(reply_menu.parent_id)  # type: ignore
+
+            if node.parent is not None:
+                node.parent.children.append(node)
+
+        for removed_id in self._inline_menus.keys() - inline_nodes.keys():
+            self._inline_menus[removed_id].children = []
+
+        for removed_id in self._reply_menus.keys() - reply_nodes.keys():
+            self._reply_menus[removed_id].children = []
+
+        self._inline_menus = inline_nodes
+        self._reply_menus = reply_nodes
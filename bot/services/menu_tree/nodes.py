@@ -0,0 +1,35 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from ...utils.enums import Alignment
+from ..database.models import MessageFile
+
+
+@dataclass(eq=False)
+class InlineMenuNode:
+    id: int
+    name: Optional[str] = None
+    text: Optional[str] = None
+    url: Optional[str] = None
+    back_button_text: Optional[str] = None
+    alignment: Alignment = Alignment.horizontal
+    position: Optional[int] = None
+    version: int = 0
+
+    parent: Optional["InlineMenuNode"] = None
+    children: List["InlineMenuNode"] = field(default_factory=list)
+    file: Optional[MessageFile] = None
+
+
+@dataclass(eq=False)
+class ReplyMenuNode:
+    id: int
+    inline_menu: InlineMenuNode
+    name: Optional[str] = None
+    back_button_text: Optional[str] = None
+    alignment: Alignment = Alignment.vertical
+    position: Optional[int] = None
+    version: int = 0
+
+    parent: Optional["ReplyMenuNode"] = None
+    children: List["ReplyMenuNode"] = field(default_factory=list)
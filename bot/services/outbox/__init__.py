@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, Tuple, Union
+
+from aiogram.methods import TelegramMethod
+
+from ...bot import bot
+from ...utils.enums import Lane
+from ...utils.lanes import outbound_lane
+from ...utils.methods import DeleteMessages
+from .chat_queue import DELETE_METHOD_TYPES, ChatQueue
+
+QueueKey = Tuple[Union[int, str], bool]  # (chat id, is the queue of deletes)
+
+
+def log_failure(future: asyncio.Future):
+    # callers may submit and never look at the result
+    if not future.cancelled() and (exception := future.exception()) is not None:
+        logging.debug("Outbound request failed: %s", exception)
+
+
+class OutboxService:
+    def __init__(self, *, dispose_timeout: float = 5):
+        self.dispose_timeout = dispose_timeout
+        self.sent_count = 0
+        self.coalesced_count = 0
+        self.failed_count = 0
+        self._queues: Dict[QueueKey, ChatQueue] = {}
+        self._tasks: Dict[QueueKey, asyncio.Task] = {}
+
+    async def setup(self):
+        pass
+
+    async def dispose(self):
+        if self._tasks:
+            await asyncio.wait(self._tasks.values(), timeout=self.dispose_timeout)
+
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+    def submit(self, method: TelegramMethod) -> asyncio.Future:
+        chat_id: int = method.chat_id  # type: ignore
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(log_failure)
+
+        # deletes touch other messages than the sends and edits after them, so
+        # they drain in the background and never hold up the next screen
+        if isinstance(method, DELETE_METHOD_TYPES):
+            key, lane = (chat_id, True), Lane.bulk
+        else:
+            key, lane = (chat_id, False), outbound_lane.get()
+
+        if (queue := self._queues.get(key)) is None:
+            queue = self._queues[key] = ChatQueue()
+
+        if queue.push(method, lane, future):
+            self.coalesced_count += 1
+
+        # a single worker per queue keeps requests in submission order
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._process(key))
+
+        return future
+
+    def delete(self, chat_id: int, message_ids: Iterable[int]):
+        return self.submit(DeleteMessages(chat_id=chat_id, message_ids=message_ids))
+
+    async def _process(self, key: QueueKey):
+        queue = self._queues[key]
+
+        try:
+            while queue:
+                item = queue.pop()
+
+                try:
+                    result = await bot(item.method, lane=item.lane)
+                except asyncio.CancelledError:
+                    item.cancel()
+                    raise
+                except Exception as e:
+                    self.failed_count += 1
+                    item.set_exception(e)
+                else:
+                    self.sent_count += 1
+                    item.set_result(result)
+        finally:
+            while queue:
+                queue.pop().cancel()
+
+            del self._tasks[key]
+            del self._queues[key]
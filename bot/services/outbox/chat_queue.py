@@ -0,0 +1,146 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, List, Optional
+
+from aiogram.methods import (
+    DeleteMessage,
+    EditMessageCaption,
+    EditMessageMedia,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    TelegramMethod,
+)
+
+from ...utils.enums import Lane
+from ...utils.methods import DeleteMessages
+
+DELETE_MESSAGES_LIMIT = 100
+
+DELETE_METHOD_TYPES = (DeleteMessage, DeleteMessages)
+
+EDIT_METHOD_TYPES = (
+    EditMessageText,
+    EditMessageMedia,
+    EditMessageCaption,
+    EditMessageReplyMarkup,
+)
+
+# edit type -> pending edits of the same message that it makes pointless
+SUPERSEDED_EDIT_TYPES = {
+    EditMessageText: (EditMessageText, EditMessageReplyMarkup),
+    EditMessageMedia: (EditMessageMedia, EditMessageCaption, EditMessageReplyMarkup),
+    EditMessageCaption: (EditMessageCaption, EditMessageReplyMarkup),
+    EditMessageReplyMarkup: (EditMessageReplyMarkup,),
+}
+
+
+@dataclass(slots=True)
+class OutboundItem:
+    method: TelegramMethod
+    lane: Lane
+    # the first one is the item's own, the rest are of items merged into it
+    futures: List[asyncio.Future] = field(default_factory=list)
+
+    def set_result(self, result: Any):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(result)
+
+    def set_exception(self, exception: BaseException):
+        for future in self.futures:
+            if not future.done():
+                future.set_exception(exception)
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+
+class ChatQueue:
+    def __init__(self):
+        self._items: Deque[OutboundItem] = deque()
+
+    def __len__(self):
+        return len(self._items)
+
+    def pop(self):
+        return self._items.popleft()
+
+    def push(self, method: TelegramMethod, lane: Lane, future: asyncio.Future):
+        # returns True when the request was merged into a pending one
+        if isinstance(method, DeleteMessage):
+            method = DeleteMessages(
+                chat_id=method.chat_id, message_ids=[method.message_id]
+            )
+
+        if isinstance(method, DeleteMessages):
+            merged = self._merge_delete(method, lane, future)
+        elif isinstance(method, EDIT_METHOD_TYPES) and method.message_id is not None:
+            merged = self._merge_edit(method, lane, future)
+        else:
+            merged = False
+
+        if not merged:
+            self._items.append(OutboundItem(method, lane, [future]))
+
+        return merged
+
+    def _merge_delete(
+        self, method: DeleteMessages, lane: Lane, future: asyncio.Future
+    ):
+        # deleted messages already exist, so deleting them earlier is harmless
+        for item in reversed(self._items):
+            if not isinstance(item.method, DeleteMessages):
+                continue
+
+            message_ids = item.method.message_ids
+            new_message_ids = [m for m in method.message_ids if m not in message_ids]
+
+            if len(message_ids) + len(new_message_ids) > DELETE_MESSAGES_LIMIT:
+                return False
+
+            message_ids.extend(new_message_ids)
+            # lanes are in priority order, a merged item keeps the most urgent one
+            item.lane = min(item.lane, lane)
+            item.futures.append(future)
+            return True
+
+        return False
+
+    def _find_pending_edit(self, method: TelegramMethod) -> Optional[OutboundItem]:
+        for item in reversed(self._items):
+            if (
+                isinstance(item.method, EDIT_METHOD_TYPES)
+                and item.method.message_id == method.message_id
+            ):
+                return item
+
+        return None
+
+    def _merge_edit(self, method: TelegramMethod, lane: Lane, future: asyncio.Future):
+        if (pending_item := self._find_pending_edit(method)) is None:
+            return False
+
+        pending_method = pending_item.method
+
+        # a keyboard change rides along with a pending content edit
+        if isinstance(method, EditMessageReplyMarkup) and not isinstance(
+            pending_method, EditMessageReplyMarkup
+        ):
+            pending_method.reply_markup = method.reply_markup
+            pending_item.lane = min(pending_item.lane, lane)
+            pending_item.futures.append(future)
+            return True
+
+        if not isinstance(pending_method, SUPERSEDED_EDIT_TYPES[type(method)]):
+            return False
+
+        # the superseded edit is dropped, its callers get the result of the new one
+        self._items.remove(pending_item)
+        self._items.append(
+            OutboundItem(
+                method, min(pending_item.lane, lane), [future, *pending_item.futures]
+            )
+        )
+        return True
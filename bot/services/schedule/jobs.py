@@ -1,4 +1,23 @@
+from aiogram.fsm.storage.base import BaseStorage
+
+from ...bot import bot
+from ...utils.storage import SQLiteStorage
+from ..analytics import AnalyticsService
+from ..bot_user import BotUserService
 
 
 async def test_job():
     print("hello world")
+
+
+async def evict_idle_fsm_records(storage: BaseStorage):
+    if isinstance(storage, SQLiteStorage):
+        storage.evict_idle(bot.config.fsm_idle_ttl)
+
+
+async def flush_user_activities(bot_user_service: BotUserService):
+    await bot_user_service.flush_activities()
+
+
+async def flush_click_rollups(analytics_service: AnalyticsService):
+    await analytics_service.flush()
@@ -1,21 +1,94 @@
-import asyncio
+from typing import List, Optional, TypeVar, Union
 
 from aiogram import exceptions
 from aiogram.client.bot import Bot as AiogramBot
+from aiogram.methods import TelegramMethod
 
 from ..models.config.bot_config import BotConfig
 from ..models.phrases.bot_phrases import BotPhrases
+from .enums import Lane
+from .lanes import outbound_lane
+from .methods import DeleteMessages
+from .rate_limiter import RateLimiter
+
+T = TypeVar("T")
 
 
 class Bot(AiogramBot):
-    def __init__(self, config: BotConfig, phrases: BotPhrases, *args, **kwargs):
+    def __init__(
+        self,
+        config: BotConfig,
+        phrases: BotPhrases,
+        *args,
+        max_retries: int = 3,
+        max_retry_after: float = 60,
+        **kwargs,
+    ):
         super().__init__(*args, token=config.bot_token, **kwargs)
+        self.set_config(config)
+        self.set_phrases(phrases)
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.rate_limiter = RateLimiter(
+            rate=config.api_rate,
+            private_chat_rate=config.private_chat_rate,
+            group_chat_rate=config.group_chat_rate_per_minute / 60,
+        )
+
+    # derived lookups are swapped together with the model, so handlers never see
+    # a new config with old admin ids or phrases with an old index
+    def set_config(self, config: BotConfig):
         self.config = config
+        self.admin_user_ids = frozenset(config.admin_user_ids)
+
+    def set_phrases(self, phrases: BotPhrases):
         self.phrases = phrases
+        self.phrase_index = phrases.index()
+
+    async def delete_messages(
+        self,
+        chat_id: Union[int, str],
+        message_ids: List[int],
+        request_timeout: Optional[int] = None,
+    ) -> bool:
+        call = DeleteMessages(chat_id=chat_id, message_ids=message_ids)
+        return await self(call, request_timeout=request_timeout)
+
+    def stream_file(self, file_path: str, timeout: int = 30, chunk_size: int = 65536):
+        url = self.session.api.file_url(self.token, file_path)
+        return self.session.stream_content(
+            url=url, timeout=timeout, chunk_size=chunk_size, raise_for_status=True
+        )
+
+    async def __call__(
+        self,
+        method: TelegramMethod[T],
+        request_timeout: Optional[int] = None,
+        *,
+        handle_retry_after: bool = True,
+        lane: Optional[Lane] = None,
+    ) -> T:
+        lane = outbound_lane.get() if lane is None else lane
+        retries_count = 0
 
-    async def __call__(self, *args, **kwargs):
         while True:
+            # paced before sending, instead of collecting flood errors
+            await self.rate_limiter.acquire(method, lane)
+
             try:
-                return await super().__call__(*args, **kwargs)
+                return await super().__call__(method, request_timeout=request_timeout)
             except exceptions.TelegramRetryAfter as e:
-                await asyncio.sleep(e.retry_after)
+                # the next acquire of every request in the scope waits it out
+                self.rate_limiter.pause(method, e.retry_after)
+
+                if not handle_retry_after:
+                    raise
+
+                if (
+                    retries_count >= self.max_retries
+                    or e.retry_after > self.max_retry_after
+                ):
+                    self.rate_limiter.stats.exhausted_count += 1
+                    raise
+
+                retries_count += 1
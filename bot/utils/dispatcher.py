@@ -2,6 +2,7 @@ from typing import Any
 
 from aiogram import Dispatcher as AiogramDispatcher
 
+from .journal import EventJournal
 from .service_manager import ServiceManager
 
 
@@ -9,3 +10,4 @@ class Dispatcher(AiogramDispatcher):
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
         self.services = ServiceManager()
+        self.journal = EventJournal()
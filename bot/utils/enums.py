@@ -4,3 +4,34 @@ from enum import IntEnum
 class Alignment(IntEnum):
     vertical = 0
     horizontal = 1
+
+
+class MailingStatus(IntEnum):
+    running = 0
+    finished = 1
+    paused = 2
+    cancelled = 3
+    failed = 4
+
+
+class DeliveryStatus(IntEnum):
+    pending = 0
+    sent = 1
+    blocked = 2
+    not_found = 3
+    failed = 4
+
+
+class ClickNodeType(IntEnum):
+    any = 0  # every tracked click, for the unique users of the whole bot
+    start = 1
+    reply_menu = 2
+    inline_menu = 3
+    back = 4
+
+
+class Lane(IntEnum):
+    # in priority order
+    interactive = 0
+    admin = 1
+    bulk = 2
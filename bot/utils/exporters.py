@@ -0,0 +1,81 @@
+import csv
+import gzip
+import json
+from pathlib import Path
+from typing import IO, Iterable, Sequence, Union
+
+from openpyxl import Workbook
+
+EXPORT_FORMATS = ("xlsx", "csv", "csv.gz", "jsonl", "jsonl.gz")
+
+
+def open_text_file(path: Path, compress: bool) -> IO[str]:
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+class XlsxExporter:
+    def __init__(self, path: Path, columns: Sequence[str]):
+        self.path = path
+        # write-only rows go straight to a temporary file instead of staying in memory
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet()
+        self._ws.append(columns)
+
+    def write_rows(self, rows: Iterable[Sequence]):
+        for row in rows:
+            self._ws.append(row)
+
+    def close(self):
+        self._wb.save(self.path)
+
+
+class CsvExporter:
+    def __init__(self, path: Path, columns: Sequence[str], *, compress: bool = False):
+        self._file = open_text_file(path, compress)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write_rows(self, rows: Iterable[Sequence]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlExporter:
+    def __init__(self, path: Path, columns: Sequence[str], *, compress: bool = False):
+        self._file = open_text_file(path, compress)
+        self._columns = columns
+
+    def write_rows(self, rows: Iterable[Sequence]):
+        self._file.writelines(
+            json.dumps(dict(zip(self._columns, row)), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+    def close(self):
+        self._file.close()
+
+
+Exporter = Union[XlsxExporter, CsvExporter, JsonlExporter]
+
+
+def create_exporter(
+    export_format: str, path: Path, columns: Sequence[str]
+) -> Exporter:
+    if export_format == "xlsx":
+        return XlsxExporter(path, columns)
+
+    file_format, _, compression = export_format.partition(".")
+    compress = compression == "gz"
+
+    if file_format == "csv":
+        return CsvExporter(path, columns, compress=compress)
+
+    if file_format == "jsonl":
+        return JsonlExporter(path, columns, compress=compress)
+
+    raise ValueError(f"Unknown export format {export_format}")
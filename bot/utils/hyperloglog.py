@@ -0,0 +1,38 @@
+import hashlib
+import math
+from typing import Optional
+
+PRECISION = 10
+
+
+class HyperLogLog:
+    def __init__(self, registers: Optional[bytes] = None):
+        self.registers_count = 1 << PRECISION
+        self.registers = bytearray(registers or self.registers_count)
+
+    def add(self, value: int):
+        digest = hashlib.blake2b(
+            value.to_bytes(8, "little", signed=True), digest_size=8
+        ).digest()
+        hashed = int.from_bytes(digest, "little")
+        index = hashed & (self.registers_count - 1)
+        rest = hashed >> PRECISION
+        rank = (64 - PRECISION) - rest.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def __len__(self):
+        m = self.registers_count
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0**-r for r in self.registers)
+        zeros_count = self.registers.count(0)
+
+        # linear counting is more accurate for small sets
+        if estimate <= 2.5 * m and zeros_count:
+            estimate = m * math.log(m / zeros_count)
+
+        return round(estimate)
@@ -0,0 +1,128 @@
+import asyncio
+import gzip
+import json
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional
+
+SEGMENT_FILENAME = "events.jsonl"
+
+
+class EventJournal:
+    def __init__(
+        self,
+        *,
+        queue_size: int = 10_000,
+        batch_size: int = 1000,
+        max_segment_size: int = 64 * 2**20,
+        max_segment_age: float = 3600,
+    ):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_segment_size = max_segment_size
+        self.max_segment_age = max_segment_age
+        self.path: Optional[Path] = None
+        self.dropped_count = 0
+
+        self._queue: Optional[asyncio.Queue[Optional[Dict[str, Any]]]] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._segment: Optional[IO[str]] = None
+        self._segment_opened_at = 0.0
+
+    def start(self, path: Path):
+        path.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._queue = asyncio.Queue(self.queue_size)
+        self._writer_task = asyncio.create_task(self._write_batches())
+
+    def record(self, event_type: str, **fields: Any):
+        if self._queue is None:
+            return
+
+        fields["type"] = event_type
+        fields["time"] = time.time()
+
+        # handlers never wait for the journal
+        try:
+            self._queue.put_nowait(fields)
+        except asyncio.QueueFull:
+            self.dropped_count += 1
+
+    async def close(self):
+        if self._queue is None or self._writer_task is None:
+            return
+
+        queue, self._queue = self._queue, None
+        await queue.put(None)
+        await self._writer_task
+        self._writer_task = None
+        await asyncio.to_thread(self._close_segment)
+
+    async def _write_batches(self):
+        queue = self._queue
+        assert queue is not None
+
+        while True:
+            events: List[Dict[str, Any]] = []
+            closing = False
+
+            event = await queue.get()
+
+            while True:
+                if event is None:
+                    closing = True
+                    break
+
+                events.append(event)
+
+                if len(events) >= self.batch_size or queue.empty():
+                    break
+
+                event = queue.get_nowait()
+
+            if events:
+                # serializing, writing and rotating stay off the event loop
+                await asyncio.to_thread(self._write, events)
+
+            if closing:
+                return
+
+    def _write(self, events: List[Dict[str, Any]]):
+        assert self.path is not None
+
+        if self._segment is not None and (
+            self._segment.tell() >= self.max_segment_size
+            or time.monotonic() - self._segment_opened_at >= self.max_segment_age
+        ):
+            self._close_segment()
+
+        if self._segment is None:
+            self._segment = open(
+                self.path / SEGMENT_FILENAME, "a", encoding="utf-8", newline="\n"
+            )
+            self._segment_opened_at = time.monotonic()
+
+        self._segment.writelines(
+            json.dumps(event, ensure_ascii=False, default=str) + "\n"
+            for event in events
+        )
+        self._segment.flush()
+
+    def _close_segment(self):
+        if self._segment is None:
+            return
+
+        self._segment.close()
+        self._segment = None
+
+        assert self.path is not None
+        segment_path = self.path / SEGMENT_FILENAME
+        closed_at = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        archive_path = self.path / f"events-{closed_at}.jsonl.gz"
+
+        with open(segment_path, "rb") as segment, gzip.open(archive_path, "wb") as gz:
+            shutil.copyfileobj(segment, gz)
+
+        segment_path.unlink()
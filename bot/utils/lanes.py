@@ -0,0 +1,96 @@
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from .enums import Lane
+from .token_bucket import TokenBucket
+
+# a lane taken by every request of the current task, unless passed explicitly
+outbound_lane: ContextVar[Lane] = ContextVar(
+    "outbound_lane", default=Lane.interactive
+)
+
+DEFAULT_LANE_WEIGHTS = {Lane.interactive: 16, Lane.admin: 4, Lane.bulk: 1}
+
+
+@contextmanager
+def use_lane(lane: Lane):
+    token = outbound_lane.set(lane)
+
+    try:
+        yield
+    finally:
+        outbound_lane.reset(token)
+
+
+@dataclass(slots=True)
+class LaneStats:
+    depth: int = 0
+    granted_count: int = 0
+
+
+class LanedTokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        weights: Optional[Dict[Lane, int]] = None,
+    ):
+        self.weights = weights or DEFAULT_LANE_WEIGHTS
+        self.stats = {lane: LaneStats() for lane in Lane}
+
+        self._bucket = TokenBucket(rate, capacity)
+        self._waiters: Dict[Lane, Deque[asyncio.Future]] = {
+            lane: deque() for lane in Lane
+        }
+        self._credits = dict(self.weights)
+        self._grant_task: Optional[asyncio.Task] = None
+
+    def pause(self, delay: float):
+        self._bucket.pause(delay)
+
+    async def acquire(self, lane: Lane):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(future)
+        self.stats[lane].depth += 1
+
+        if self._grant_task is None or self._grant_task.done():
+            self._grant_task = asyncio.create_task(self._grant())
+
+        try:
+            await future
+        finally:
+            # a cancelled waiter is skipped by the granter
+            self.stats[lane].depth -= 1
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        # weighted round robin: a lane with waiters spends a credit per token,
+        # credits are refilled when no waiting lane has any left
+        for _ in range(2):
+            for lane in Lane:
+                waiters = self._waiters[lane]
+
+                while waiters and waiters[0].done():
+                    waiters.popleft()
+
+                if waiters and self._credits[lane] > 0:
+                    self._credits[lane] -= 1
+                    self.stats[lane].granted_count += 1
+                    return waiters.popleft()
+
+            if not any(self._waiters.values()):
+                return None
+
+            self._credits = dict(self.weights)
+
+        return None
+
+    async def _grant(self):
+        while any(self._waiters.values()):
+            await self._bucket.acquire()
+
+            if (future := self._next_waiter()) is not None:
+                future.set_result(None)
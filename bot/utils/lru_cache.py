@@ -0,0 +1,47 @@
+from collections import OrderedDict
+from typing import Generic, Hashable, Iterator, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[K, V]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key: K):
+        return key in self._items
+
+    def items(self) -> Iterator[Tuple[K, V]]:
+        # least recently used first
+        return iter(self._items.items())
+
+    def get(self, key: K) -> Optional[V]:
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V):
+        self._items[key] = value
+        self._items.move_to_end(key)
+
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def pop(self, key: K) -> Optional[V]:
+        return self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
@@ -0,0 +1,19 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Union
+
+from aiogram.methods.base import Request, TelegramMethod
+
+if TYPE_CHECKING:
+    from aiogram.client.bot import Bot
+
+
+# Bot API 7.0 method, not shipped with the pinned aiogram revision
+class DeleteMessages(TelegramMethod[bool]):
+    __returning__ = bool
+
+    chat_id: Union[int, str]
+    message_ids: List[int]
+
+    def build_request(self, bot: "Bot") -> Request:
+        data: Dict[str, Any] = self.dict()
+
+        return Request(method="deleteMessages", data=data)
@@ -0,0 +1,140 @@
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+from aiogram.methods import TelegramMethod
+
+from .enums import Lane
+from .lanes import LanedTokenBucket
+from .lru_cache import LRUCache
+from .token_bucket import TokenBucket
+
+# only these count towards the per chat limits of Telegram
+CHAT_LIMITED_METHOD_PREFIXES = ("Send", "Copy", "Forward", "Edit")
+
+# bulk methods get their own budget, so that a cleanup does not eat the global one
+DEFAULT_METHOD_RATES = {"DeleteMessage": 20, "DeleteMessages": 10}
+
+
+@dataclass(slots=True)
+class RateLimiterStats:
+    requests_count: int = 0
+    delayed_count: int = 0
+    wait_time: float = 0
+    max_wait_time: float = 0
+    retry_after_count: int = 0
+    retry_after_time: float = 0
+    exhausted_count: int = 0
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        *,
+        rate: float = 30,
+        private_chat_rate: float = 1,
+        group_chat_rate: float = 20 / 60,
+        method_rates: Optional[Dict[str, float]] = None,
+        lane_weights: Optional[Dict[Lane, int]] = None,
+        chats_cache_size: int = 100_000,
+        flood_window: float = 1,
+    ):
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_rate
+        self.flood_window = flood_window
+        self.stats = RateLimiterStats()
+
+        # the global budget is what all kinds of traffic share, so it is split
+        # into lanes
+        self._global_bucket = LanedTokenBucket(rate, weights=lane_weights)
+        self._method_buckets = {
+            name: TokenBucket(method_rate)
+            for name, method_rate in (method_rates or DEFAULT_METHOD_RATES).items()
+        }
+        # idle chats are dropped, a fresh bucket starts full anyway
+        self._chat_buckets: LRUCache[Union[int, str], TokenBucket] = LRUCache(
+            maxsize=chats_cache_size
+        )
+        # (time, chat id) of recent flood errors of chat methods
+        self._chat_floods: Deque[Tuple[float, Union[int, str]]] = deque()
+
+    def _get_chat_bucket(self, method: TelegramMethod):
+        if not type(method).__name__.startswith(CHAT_LIMITED_METHOD_PREFIXES):
+            return None
+
+        if (chat_id := getattr(method, "chat_id", None)) is None:
+            return None
+
+        if (bucket := self._chat_buckets.get(chat_id)) is None:
+            # user ids are positive, groups and channels are negative or @usernames
+            if isinstance(chat_id, int) and chat_id > 0:
+                # a screen is a couple of messages, they should not wait for each other
+                bucket = TokenBucket(self.private_chat_rate, capacity=5)
+            else:
+                bucket = TokenBucket(self.group_chat_rate, capacity=3)
+
+            self._chat_buckets.set(chat_id, bucket)
+
+        return bucket
+
+    def _get_method_bucket(self, method: TelegramMethod):
+        return self._method_buckets.get(type(method).__name__)
+
+    @property
+    def lanes(self):
+        return self._global_bucket.stats
+
+    def _get_buckets(self, method: TelegramMethod):
+        buckets: List[TokenBucket] = []
+
+        if (chat_bucket := self._get_chat_bucket(method)) is not None:
+            buckets.append(chat_bucket)
+
+        if (method_bucket := self._get_method_bucket(method)) is not None:
+            buckets.append(method_bucket)
+
+        return buckets
+
+    async def acquire(self, method: TelegramMethod, lane: Lane):
+        started_at = time.monotonic()
+
+        for bucket in self._get_buckets(method):
+            await bucket.acquire()
+
+        # the global bucket goes last, its tokens are not held while waiting for a chat
+        await self._global_bucket.acquire(lane)
+
+        wait_time = time.monotonic() - started_at
+        self.stats.requests_count += 1
+
+        if wait_time >= 0.001:
+            self.stats.delayed_count += 1
+            self.stats.wait_time += wait_time
+            self.stats.max_wait_time = max(self.stats.max_wait_time, wait_time)
+
+    def _is_global_flood(self, chat_id: Union[int, str]):
+        now = time.monotonic()
+        self._chat_floods.append((now, chat_id))
+
+        while self._chat_floods[0][0] < now - self.flood_window:
+            self._chat_floods.popleft()
+
+        return len({chat_id for _, chat_id in self._chat_floods}) > 1
+
+    def pause(self, method: TelegramMethod, retry_after: float):
+        # scopes: a flood error of a chat method pauses that chat, and the global
+        # budget too when other chats got one within flood_window, as then it is
+        # the bot-wide limit; others pause their method budget or the global one
+        self.stats.retry_after_count += 1
+        self.stats.retry_after_time += retry_after
+
+        if (chat_bucket := self._get_chat_bucket(method)) is not None:
+            chat_bucket.pause(retry_after)
+
+            if self._is_global_flood(method.chat_id):  # type: ignore
+                self._global_bucket.pause(retry_after)
+        elif (method_bucket := self._get_method_bucket(method)) is not None:
+            method_bucket.pause(retry_after)
+        else:
+            self._global_bucket.pause(retry_after)
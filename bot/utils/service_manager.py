@@ -1,30 +1,113 @@
 import asyncio
-from typing import List
+import re
+from typing import Callable, Dict, List, Optional, Tuple, Type, TypeVar
 
 from ..protocols.service import Service
 
+T = TypeVar("T")
+
+
+def snake_case(s: str):
+    return "_".join(
+        re.sub(
+            "([A-Z][a-z]+)", r" \1", re.sub("([A-Z]+)", r" \1", s.replace("-", " "))
+        ).split()
+    ).lower()
+
 
 class ServiceManager:
     def __init__(self):
         self._services: List[Service] = []
+        self._services_by_key: Dict[str, Service] = {}
+        self._factories: Dict[str, Tuple[Type[Service], Callable[[], Service]]] = {}
+        self._resolving: Dict[str, asyncio.Task] = {}
+        # bumped on every change, so that cached injection plans can be dropped
+        self.revision = 0
 
-    def register(self, service: Service):
+    def register(self, service: Service, *, key: Optional[str] = None):
+        key = key or snake_case(service.__class__.__name__)
         self._services.append(service)
+        self._services_by_key[key] = service
+        self.revision += 1
         return service
 
+    def register_lazy(
+        self,
+        service_type: Type[T],
+        factory: Callable[[], T],
+        *,
+        key: Optional[str] = None,
+    ):
+        # created and set up on the first resolve, e.g. when a handler asks for it
+        key = key or snake_case(service_type.__name__)
+        self._factories[key] = (service_type, factory)
+        self.revision += 1
+
     def unregister(self, service: Service):
         self._services.remove(service)
 
+        for key, registered_service in list(self._services_by_key.items()):
+            if registered_service is service:
+                del self._services_by_key[key]
+
+        self.revision += 1
+
+    @property
+    def keys(self):
+        return self._services_by_key.keys() | self._factories.keys()
+
+    def has(self, key: str):
+        return key in self._services_by_key or key in self._factories
+
+    def get(self, service_type: Type[T]) -> T:
+        for service in self._services:
+            if isinstance(service, service_type):
+                return service
+
+        for lazy_service_type, _ in self._factories.values():
+            if issubclass(lazy_service_type, service_type):
+                raise LookupError(
+                    f"Service {service_type.__name__} is lazy and was not resolved yet"
+                )
+
+        raise LookupError(f"Service {service_type.__name__} is not registered")
+
+    async def resolve(self, key: str) -> Service:
+        if (service := self._services_by_key.get(key)) is not None:
+            return service
+
+        if key not in self._factories:
+            raise LookupError(f"Service {key} is not registered")
+
+        # concurrent updates wait for the same setup instead of creating it twice
+        if (task := self._resolving.get(key)) is None:
+            task = asyncio.create_task(self._create(key))
+            self._resolving[key] = task
+
+        return await asyncio.shield(task)
+
+    async def _create(self, key: str):
+        _, factory = self._factories[key]
+
+        try:
+            service = factory()
+            await service.setup()
+            del self._factories[key]
+            return self.register(service, key=key)
+        finally:
+            del self._resolving[key]
+
     async def setup_all(self):
         if not self._services:
             return
 
-        service_setup_coros = (service.setup() for service in self._services)
-        await asyncio.gather(*(service_setup_coros))
+        # services are set up in registration order, later ones may depend on earlier
+        for service in self._services:
+            await service.setup()
 
     async def dispose_all(self):
         if not self._services:
             return
 
-        service_dispose_coros = (service.dispose() for service in self._services)
-        await asyncio.gather(*service_dispose_coros)
+        for service in reversed(self._services):
+            await service.dispose()
@@ -0,0 +1,228 @@
+import asyncio
+import copy
+import json
+import logging
+import time
+from contextlib import suppress
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import aiosqlite
+from aiogram import Bot
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from .lru_cache import LRUCache
+
+
+@dataclass(slots=True)
+class StorageRecord:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    accessed_at: float = field(default_factory=time.monotonic)
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(
+        self,
+        path: Path,
+        *,
+        cache_size: int = 10_000,
+        flush_interval: float = 1,
+        flush_size: int = 500,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+
+        self._connection: Optional[aiosqlite.Connection] = None
+        self._connection_lock = asyncio.Lock()
+        self._records: LRUCache[str, StorageRecord] = LRUCache(maxsize=cache_size)
+        self._dirty_records: Dict[str, StorageRecord] = {}
+        self._loading: Dict[str, "asyncio.Future[StorageRecord]"] = {}
+        self._flush_event = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _make_key(key: StorageKey):
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.destiny}"
+
+    async def _get_connection(self):
+        async with self._connection_lock:
+            if self._connection is None:
+                self._connection = await aiosqlite.connect(self.path)
+                await self._connection.executescript(
+                    "PRAGMA journal_mode = WAL;"
+                    "PRAGMA synchronous = NORMAL;"
+                    "CREATE TABLE IF NOT EXISTS fsm ("
+                    "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL"
+                    ");"
+                )
+                self._flush_task = asyncio.create_task(self._flush_periodically())
+
+        return self._connection
+
+    async def _load_record(self, storage_key: str):
+        connection = await self._get_connection()
+
+        async with connection.execute(
+            "SELECT state, data FROM fsm WHERE key = ?", (storage_key,)
+        ) as cursor:
+            row = await cursor.fetchone()
+
+        if row is None:
+            record = StorageRecord()
+        else:
+            record = StorageRecord(state=row[0], data=json.loads(row[1]))
+
+        self._records.set(storage_key, record)
+        return record
+
+    async def _get_record(self, key: StorageKey):
+        storage_key = self._make_key(key)
+
+        if (record := self._records.get(storage_key)) is not None:
+            record.accessed_at = time.monotonic()
+            return record
+
+        # evicted from the cache, but not written yet
+        if (record := self._dirty_records.get(storage_key)) is not None:
+            record.accessed_at = time.monotonic()
+            self._records.set(storage_key, record)
+            return record
+
+        # concurrent misses of a key share one load, and so one record
+        if (loading := self._loading.get(storage_key)) is None:
+            loading = asyncio.ensure_future(self._load_record(storage_key))
+            self._loading[storage_key] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(storage_key, None))
+
+        return await asyncio.shield(loading)
+
+    def _mark_dirty(self, key: StorageKey, record: StorageRecord):
+        self._dirty_records[self._make_key(key)] = record
+
+        if len(self._dirty_records) >= self.flush_size:
+            self._flush_event.set()
+
+    async def set_state(self, bot: Bot, key: StorageKey, state: StateType = None):
+        record = await self._get_record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(key, record)
+
+    async def get_state(self, bot: Bot, key: StorageKey) -> Optional[str]:
+        record = await self._get_record(key)
+        return record.state
+
+    async def set_data(self, bot: Bot, key: StorageKey, data: Dict[str, Any]):
+        record = await self._get_record(key)
+        record.data = data.copy()
+        self._mark_dirty(key, record)
+
+    async def get_data(self, bot: Bot, key: StorageKey) -> Dict[str, Any]:
+        record = await self._get_record(key)
+        return copy.copy(record.data)
+
+    def evict_idle(self, idle_ttl: float):
+        # only the cache shrinks, the rows stay in SQLite and are loaded on access;
+        # dirty records stay reachable until they are flushed, so nothing is lost
+        deadline = time.monotonic() - idle_ttl
+        idle_keys = []
+
+        for storage_key, record in self._records.items():
+            if record.accessed_at >= deadline:
+                break
+
+            idle_keys.append(storage_key)
+
+        for storage_key in idle_keys:
+            self._records.pop(storage_key)
+
+        return len(idle_keys)
+
+    @staticmethod
+    def _dump_data(data: Dict[str, Any]):
+        try:
+            return json.dumps(data)
+        except TypeError:
+            pass
+
+        # values that can not be serialized do not survive a restart
+        serializable_data = {}
+
+        for key, value in data.items():
+            try:
+                json.dumps(value)
+            except TypeError:
+                logging.warning("FSM data value %r is not serializable", key)
+                continue
+
+            serializable_data[key] = value
+
+        return json.dumps(serializable_data)
+
+    async def flush(self):
+        if not self._dirty_records:
+            return
+
+        dirty_records, self._dirty_records = self._dirty_records, {}
+        upserted_rows = []
+        deleted_keys = []
+
+        for storage_key, record in dirty_records.items():
+            if record.state is None and not record.data:
+                deleted_keys.append((storage_key,))
+            else:
+                upserted_rows.append(
+                    (storage_key, record.state, self._dump_data(record.data))
+                )
+
+        connection = await self._get_connection()
+
+        try:
+            await connection.executemany(
+                "INSERT INTO fsm (key, state, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "state = excluded.state, data = excluded.data",
+                upserted_rows,
+            )
+            await connection.executemany("DELETE FROM fsm WHERE key = ?", deleted_keys)
+            await connection.commit()
+        except Exception:
+            logging.exception("Could not flush FSM storage")
+            self._restore_dirty_records(dirty_records)
+        except asyncio.CancelledError:
+            self._restore_dirty_records(dirty_records)
+            raise
+
+    def _restore_dirty_records(self, dirty_records: Dict[str, StorageRecord]):
+        # keeps newer changes that were made during the failed write
+        dirty_records.update(self._dirty_records)
+        self._dirty_records = dirty_records
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._flush_event.clear()
+            await self.flush()
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+
+            with suppress(asyncio.CancelledError):
+                await self._flush_task
+
+            self._flush_task = None
+
+        if self._connection is None:
+            return
+
+        await self.flush()
+        await self._connection.close()
+        self._connection = None
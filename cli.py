@@ -1,5 +1,8 @@
+import asyncio
 import os
 import sys
+import tempfile
+import tracemalloc
 from pathlib import Path
 
 import typer
@@ -89,6 +92,74 @@ from . import router
         jump_to_file(handler_filepath)
 
 
+@app.command()
+def migrate_blobs():
+    moved_count = asyncio.run(move_database_blobs())
+    typer.echo(f"Moved {moved_count} files to the blob store")
+
+
+async def move_database_blobs():
+    from bot.bot import bot
+    from bot.services.blob_store import BlobStoreService
+    from bot.services.blob_store.local import LocalBlobStore
+    from bot.services.database import DatabaseService
+    from bot.utils.paths import root_path
+
+    database_service = DatabaseService()
+    blob_store_service = BlobStoreService(
+        LocalBlobStore(root_path / bot.config.blob_store_path)
+    )
+
+    await database_service.setup()
+
+    try:
+        return await blob_store_service.move_database_blobs()
+    finally:
+        await database_service.dispose()
+
+
+@app.command()
+def fsm_memory(users: list[int] = typer.Option([100_000, 1_000_000])):
+    for users_count in users:
+        used_bytes, cached_count = asyncio.run(measure_fsm_memory(users_count))
+        typer.echo(
+            f"{users_count} users, {cached_count} cached: "
+            f"{used_bytes / 2**20:.1f} MiB, {used_bytes / users_count:.0f} bytes "
+            "per user"
+        )
+
+
+async def measure_fsm_memory(users_count: int):
+    from aiogram.fsm.storage.base import StorageKey
+
+    from bot.bot import bot
+    from bot.state import UserMenuState
+    from bot.utils.storage import SQLiteStorage
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        tracemalloc.start()
+        # the same storage and cache bound the bot runs with
+        storage = SQLiteStorage(Path(dirpath) / "fsm.sqlite3")
+
+        try:
+            # the same state and data the user menu handlers keep for every chat
+            for user_id in range(users_count):
+                key = StorageKey(bot_id=0, chat_id=user_id, user_id=user_id)
+                await storage.set_state(bot, key, UserMenuState.waiting_action)
+                await storage.set_data(
+                    bot,
+                    key,
+                    {"menu_id": 1, "dialog_messages": [(user_id, 1), (user_id, 2)]},
+                )
+
+            await storage.flush()
+            used_bytes, _ = tracemalloc.get_traced_memory()
+            return used_bytes, len(storage._records)
+        finally:
+            tracemalloc.stop()
+            await storage.close()
+
+
 def jump_to_file(path: Path):
     os.system(f"code {path.absolute()}")
 